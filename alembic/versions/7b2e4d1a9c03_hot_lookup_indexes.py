@@ -0,0 +1,46 @@
+"""hot lookup indexes
+
+Revision ID: 7b2e4d1a9c03
+Revises: 3f1c9a7d2b54
+Create Date: 2026-10-18 14:02:37.118205
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b2e4d1a9c03'
+down_revision: Union[str, Sequence[str], None] = '3f1c9a7d2b54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_answer_options_question_id', 'answer_options', ['question_id']),
+    ('ix_questions_category_difficulty_id', 'questions', ['category_id', 'difficulty', 'id']),
+    ('ix_questions_difficulty_id', 'questions', ['difficulty', 'id']),
+    ('ix_refresh_token_user_id', 'refresh_token', ['user_id']),
+    ('ix_exams_user_id_started_at', 'exams', ['user_id', 'started_at']),
+    ('ix_ai_prediction_logs_user_id_created_at', 'ai_prediction_logs', ['user_id', 'created_at']),
+    ('ix_ai_prediction_logs_label_created_at', 'ai_prediction_logs', ['predicted_label', 'created_at']),
+    ('ix_ai_prediction_logs_created_at', 'ai_prediction_logs', ['created_at']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,84 @@
+"""search vectors
+
+Revision ID: b6a0c7e94d15
+Revises: 9d3f6b0c2e71
+Create Date: 2026-10-18 18:41:55.207316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6a0c7e94d15'
+down_revision: Union[str, Sequence[str], None] = '9d3f6b0c2e71'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Русская конфигурация даёт стемминг, simple — точные совпадения для
+# кыргызских слов, которые русский стеммер не знает
+VECTOR = """
+    setweight(to_tsvector('russian', coalesce({main}, '')), 'A') ||
+    setweight(to_tsvector('simple', coalesce({main}, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce({extra}, '')), 'B') ||
+    setweight(to_tsvector('simple', coalesce({extra}, '')), 'B')
+"""
+
+TABLES = [
+    # таблица, основное поле, дополнительное поле
+    ('questions', 'text', 'explanation'),
+    ('videos', 'title', 'description'),
+]
+
+INDEXES = [
+    ('ix_questions_search_vector', 'questions', 'search_vector', None),
+    ('ix_questions_text_trgm', 'questions', 'text', 'gin_trgm_ops'),
+    ('ix_videos_search_vector', 'videos', 'search_vector', None),
+    ('ix_videos_title_trgm', 'videos', 'title', 'gin_trgm_ops'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    for table, main, extra in TABLES:
+        op.add_column(table, sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+        op.execute(f"""
+            CREATE FUNCTION {table}_search_vector_update() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector := {VECTOR.format(main=f'NEW.{main}', extra=f'NEW.{extra}')};
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        op.execute(f"""
+            CREATE TRIGGER {table}_search_vector_trigger
+            BEFORE INSERT OR UPDATE OF {main}, {extra} ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_search_vector_update()
+        """)
+        op.execute(f"UPDATE {table} SET search_vector = {VECTOR.format(main=main, extra=extra)}")
+
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, column, ops in INDEXES:
+            op.create_index(name, table, [column], unique=False, postgresql_using='gin',
+                            postgresql_ops={column: ops} if ops else {},
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
+
+    for table, _, _ in reversed(TABLES):
+        op.execute(f'DROP TRIGGER IF EXISTS {table}_search_vector_trigger ON {table}')
+        op.execute(f'DROP FUNCTION IF EXISTS {table}_search_vector_update()')
+        op.drop_column(table, 'search_vector')
@@ -0,0 +1,52 @@
+"""refresh token hash
+
+Revision ID: d1e7a3f58c92
+Revises: b6a0c7e94d15
+Create Date: 2026-10-18 19:36:08.774120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd1e7a3f58c92'
+down_revision: Union[str, Sequence[str], None] = 'b6a0c7e94d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('refresh_token', sa.Column('token_hash', sa.String(length=64), nullable=True))
+    op.add_column('refresh_token', sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # Строки переводим на хеш, чтобы схема осталась согласованной; срок — как у
+    # REFRESH_TOKEN_EXPIRE_DAYS по умолчанию. Сами прежние токены (без type, jti и sid)
+    # /auth/refresh больше не принимает: все, кто вошёл до обновления, входят заново
+    op.execute("DELETE FROM refresh_token WHERE token IS NULL")
+    op.execute("""
+        UPDATE refresh_token
+        SET token_hash = encode(sha256(convert_to(token, 'UTF8')), 'hex'),
+            expires_at = created_date + interval '7 days'
+    """)
+
+    op.alter_column('refresh_token', 'token_hash', existing_type=sa.String(length=64), nullable=False)
+    op.alter_column('refresh_token', 'expires_at', existing_type=sa.DateTime(), nullable=False)
+    op.create_index(op.f('ix_refresh_token_token_hash'), 'refresh_token', ['token_hash'], unique=True)
+    op.create_index(op.f('ix_refresh_token_expires_at'), 'refresh_token', ['expires_at'], unique=False)
+    op.drop_column('refresh_token', 'token')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Исходные токены по хешу не восстановить: все сессии завершаются
+    op.execute("DELETE FROM refresh_token")
+    op.add_column('refresh_token', sa.Column('token', sa.String(), nullable=True))
+    op.create_unique_constraint('refresh_token_token_key', 'refresh_token', ['token'])
+    op.drop_index(op.f('ix_refresh_token_expires_at'), table_name='refresh_token')
+    op.drop_index(op.f('ix_refresh_token_token_hash'), table_name='refresh_token')
+    op.drop_column('refresh_token', 'expires_at')
+    op.drop_column('refresh_token', 'token_hash')
@@ -0,0 +1,37 @@
+"""user listing indexes
+
+Revision ID: f42c8b1e6a07
+Revises: d1e7a3f58c92
+Create Date: 2026-10-18 20:12:40.391657
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f42c8b1e6a07'
+down_revision: Union[str, Sequence[str], None] = 'd1e7a3f58c92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_created_at', 'users', ['created_at'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_users_email_pattern', 'users', ['email'], unique=False,
+                        postgresql_ops={'email': 'varchar_pattern_ops'},
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_email_pattern', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_created_at', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,19 @@
+# Подхватывается gunicorn автоматически из рабочего каталога.
+# Метрики Prometheus при нескольких воркерах: каждый пишет свои файлы в
+# PROMETHEUS_MULTIPROC_DIR, /metrics их суммирует.
+import os
+import shutil
+
+
+def on_starting(server):
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        # Файлы от прошлого запуска дали бы неверные суммы
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,12 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi_pagination import add_pagination
 import uvicorn
 from pdd.api import (model_pdd, user, auth, video,
-                         exam, question, category)
+                         exam, question, category, monitoring, search)
 from pdd.api.model_pdd import predict_router
-
-
-
-pdd_app = FastAPI()
+from pdd.db.database import engine
+from pdd.db.redis import redis_client, cache_redis_client
+from pdd.db.config import MODEL_PRELOAD, METRICS_ENABLED, PROFILING_ENABLED
+from pdd.services.body_limit import BodySizeLimitMiddleware
+from pdd.services.metrics import MetricsMiddleware, instrument_engine
+from pdd.services.profiling import ProfilingMiddleware
+from pdd.services.passwords import password_hasher
+from pdd.services.refresh_tokens import token_purger
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_PRELOAD:
+        await model_pdd.warmup()
+    model_pdd.engine.start()
+    model_pdd.log_writer.start()
+    token_purger.start()
+    yield
+    await token_purger.stop()
+    await model_pdd.engine.stop()
+    await model_pdd.log_writer.stop()
+    model_pdd.executor.shutdown()
+    password_hasher.shutdown()
+    await redis_client.aclose()
+    if cache_redis_client is not redis_client:
+        await cache_redis_client.aclose()
+    await engine.dispose()
+
+
+pdd_app = FastAPI(lifespan=lifespan)
+pdd_app.add_middleware(BodySizeLimitMiddleware, limits=model_pdd.UPLOAD_LIMITS)
+if PROFILING_ENABLED:
+    pdd_app.add_middleware(ProfilingMiddleware)
+if METRICS_ENABLED:
+    pdd_app.add_middleware(MetricsMiddleware)
+    instrument_engine(engine)
 pdd_app.include_router(predict_router)
 pdd_app.include_router(user.user_router)
 pdd_app.include_router(auth.auth_router)
@@ -14,6 +48,10 @@ pdd_app.include_router(exam.exam_router)
 pdd_app.include_router(question.question_router)
 pdd_app.include_router(category.category_router)
 pdd_app.include_router(video.video_router)
+pdd_app.include_router(search.search_router)
+pdd_app.include_router(monitoring.monitoring_router)
+pdd_app.include_router(monitoring.metrics_router)
+add_pagination(pdd_app)
 
 
 
@@ -21,4 +59,4 @@ pdd_app.include_router(video.video_router)
 
 
 if __name__ == '__main__':
-    uvicorn.run(pdd_app, host='127.0.0.1', port=8000)
\ No newline at end of file
+    uvicorn.run(pdd_app, host='127.0.0.1', port=8000)
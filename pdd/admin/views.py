@@ -1,20 +1,65 @@
 from sqladmin import ModelView
+from sqlalchemy.exc import IntegrityError
+from starlette.exceptions import HTTPException
 from pdd.db.models import User, Category, Question, AnswerOption, Exam, Video
+from pdd.services.question_bank import questions_changed
+from pdd.services.http_cache import data_versions
+from pdd.services.auth_cache import auth_cache
+
+
+class CacheInvalidationMixin:
+    # Правки в админке должны сбрасывать кэши во всех воркерах
+    data_versions = ()
+    questions = False
+
+    async def invalidate_caches(self):
+        await data_versions.bump(*self.data_versions)
+        if self.questions:
+            await questions_changed()
+
+    async def after_model_change(self, data, model, is_created, request):
+        await self.invalidate_caches()
+
+    async def after_model_delete(self, model, request):
+        await self.invalidate_caches()
+
 
 class UserProfileAdmin(ModelView , model = User):
     column_list = [User.username , User.email , User.password]
 
-class CategoryAdmin(ModelView , model=Category):
+    # Токены хранят username/email, после правки их надо отозвать
+    async def after_model_change(self, data, model, is_created, request):
+        if not is_created:
+            await auth_cache.revoke_user(model.id)
+
+    async def after_model_delete(self, model, request):
+        await auth_cache.revoke_user(model.id)
+
+class CategoryAdmin(CacheInvalidationMixin, ModelView , model=Category):
     column_list = [Category.category_name]
+    data_versions = ('categories',)
+    questions = True
 
-class QuestionAdmin(ModelView , model = Question):
+class QuestionAdmin(CacheInvalidationMixin, ModelView , model = Question):
     column_list = [Question.text , Question.difficulty , Question.explanation]
+    form_excluded_columns = [Question.search_vector, Question.version]
+    questions = True
+
+    # Вопрос из билетов удалить нельзя, как и через API
+    async def delete_model(self, request, pk):
+        try:
+            await super().delete_model(request, pk)
+        except IntegrityError:
+            raise HTTPException(status_code=409, detail="Вопрос используется в экзаменах, удалить его нельзя")
 
-class AnswerAdmin(ModelView , model = AnswerOption):
+class AnswerAdmin(CacheInvalidationMixin, ModelView , model = AnswerOption):
     column_list = [AnswerOption.text , AnswerOption.is_correct]
+    questions = True
 
 # class ExamAdmin(ModelView , model = Exam):
 #     column_list = [Exam.score , Exam.status]
 
-class VideoAdmin(ModelView , model = Video):
-    column_list = [Video.title , Video.description]
\ No newline at end of file
+class VideoAdmin(CacheInvalidationMixin, ModelView , model = Video):
+    column_list = [Video.title , Video.description]
+    form_excluded_columns = [Video.search_vector]
+    data_versions = ('videos',)
\ No newline at end of file
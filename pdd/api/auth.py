@@ -1,14 +1,16 @@
-from fastapi import Depends, HTTPException, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import Optional
-import hashlib
-from jose import jwt
-from passlib.context import CryptContext
+import ipaddress
+import time
+import uuid
+from jose import jwt, JWTError
 from fastapi.security import (OAuth2PasswordBearer,
                               OAuth2PasswordRequestForm)
-from pdd.db.database import SessionLocal
-from pdd.db.models import User, RefreshToken
+from pdd.db.database import get_db
+from pdd.db.models import User
 from pdd.db.schema import (
     UserSchema,
     UserLoginSchema,
@@ -17,53 +19,130 @@ from pdd.db.schema import (
 from pdd.db.config import (
     ALGORITHM,SECRET_KEY,
     ACCESS_TOKEN_EXPIRE_MINUTES,
-    REFRESH_TOKEN_EXPIRE_DAYS)
+    REFRESH_TOKEN_EXPIRE_DAYS,
+    LOGIN_RATE_LIMIT_PER_USERNAME,
+    LOGIN_RATE_LIMIT_PER_IP,
+    TRUSTED_PROXIES)
+from pdd.services.passwords import password_hasher, PasswordHasherOverloaded
+from pdd.services.rate_limit import login_limiter
+from pdd.services.auth_cache import auth_cache, CurrentUser
+from pdd.services.refresh_tokens import store_refresh_token, consume_refresh_token
 
 
 auth_router = APIRouter(prefix='/auth', tags=['Auth'])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
+credentials_exception = HTTPException(status_code=401, detail='Недействительный токен',
+                                      headers={'WWW-Authenticate': 'Bearer'})
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, token_type: str = 'access'):
     to_encode =  data.copy()
     expire = datetime.utcnow() + (expires_delta if expires_delta else timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({'exp': expire})
+    # iat с дробной частью: отзыв пользователя сравнивается с ним по времени
+    to_encode.update({'exp': expire, 'iat': time.time(), 'type': token_type})
+    to_encode.setdefault('jti', uuid.uuid4().hex)
     return jwt.encode( to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict):
-    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+                               token_type='refresh')
+
+def user_claims(user: User) -> dict:
+    # Всё, что нужно роутам о пользователе, чтобы не читать таблицу users
+    return {'sub': str(user.id), 'username': user.username, 'email': user.email}
+
+def decode_token(token: str, token_type: str, verify_exp: bool = True) -> dict:
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM],
+                            options={'verify_exp': verify_exp})
+    except JWTError:
+        raise credentials_exception
+    if claims.get('type') != token_type or 'jti' not in claims:
+        raise credentials_exception
+    if token_type == 'refresh' and 'sid' not in claims:
+        raise credentials_exception
+    return claims
+
+async def resolve_user(token: str) -> CurrentUser:
+    claims = decode_token(token, 'access')
+    user = auth_cache.get(claims['jti'])
+    if user is not None:
+        return user
+
+    try:
+        user = CurrentUser(int(claims['sub']), claims['username'], claims.get('email'))
+    except (KeyError, TypeError, ValueError):
+        raise credentials_exception
+    if await auth_cache.is_revoked(user.id, claims.get('sid'), claims['iat']):
+        raise credentials_exception
+    auth_cache.put(claims['jti'], claims.get('sid'), user, claims['exp'] - time.time())
+    return user
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    return await resolve_user(token)
+
+async def get_optional_user(token: Optional[str] = Depends(optional_oauth2_scheme)) -> Optional[CurrentUser]:
+    # Без токена — аноним; с неверным токеном — всё равно 401
+    if token is None:
+        return None
+    return await resolve_user(token)
+
+async def verify_password(plain_password: str, hashed_password: Optional[str]):
+    try:
+        return await password_hasher.verify_and_update(plain_password, hashed_password)
+    except PasswordHasherOverloaded:
+        raise HTTPException(status_code=503, detail='Сервер перегружен, повторите позже',
+                            headers={'Retry-After': '1'})
+
+async def get_password_hash(password: str) -> str:
+    try:
+        return await password_hasher.hash(password)
+    except PasswordHasherOverloaded:
+        raise HTTPException(status_code=503, detail='Сервер перегружен, повторите позже',
+                            headers={'Retry-After': '1'})
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    sha = hashlib.sha256(plain_password.encode('utf-8')).digest()
-    return pwd_context.verify(sha, hashed_password)
+trusted_proxies = [ipaddress.ip_network(value, strict=False) for value in TRUSTED_PROXIES]
 
-def get_password_hash(password: str) -> str:
-    sha = hashlib.sha256(password.encode("utf-8")).digest()
-    return pwd_context.hash(sha)
+def is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in trusted_proxies)
+
+def client_ip(request: Request) -> str:
+    # За nginx настоящий адрес приходит в X-Real-IP, но верим ему только от своего прокси:
+    # иначе клиент подставит любой адрес и обойдёт лимит по IP
+    peer = request.client.host if request.client else 'unknown'
+    real_ip = request.headers.get('x-real-ip')
+    if real_ip and is_trusted_proxy(peer):
+        return real_ip
+    return peer
+
+async def check_login_rate(request: Request, username: str):
+    for name, limit in ((f'user:{username.lower()}', LOGIN_RATE_LIMIT_PER_USERNAME),
+                        (f'ip:{client_ip(request)}', LOGIN_RATE_LIMIT_PER_IP)):
+        retry_after = await login_limiter.check(name, limit)
+        if retry_after is not None:
+            raise HTTPException(status_code=429, detail='Слишком много попыток входа, повторите позже',
+                                headers={'Retry-After': str(retry_after)})
 
 
 
 @auth_router.post('/register', response_model=dict)
 async def auth_register(user: UserCreateSchema,
-                        db: Session = Depends(get_db)):
-    check_user = db.query(User).filter(User.username == user.username).first()
+                        db: AsyncSession = Depends(get_db)):
+    check_user = await db.scalar(select(User).where(User.username == user.username))
 
     if check_user:
         raise HTTPException(status_code=404, detail='User already exists')
 
-    check_email = db.query(User).filter(User.email == user.email).first()
+    check_email = await db.scalar(select(User).where(User.email == user.email))
     if check_email:
         raise HTTPException(status_code=404, detail='Email already exists')
 
-    hash_password = get_password_hash(user.password)
+    hash_password = await get_password_hash(user.password)
     user_db = User(
         email=user.email,
         username=user.username,
@@ -71,50 +150,74 @@ async def auth_register(user: UserCreateSchema,
     )
 
     db.add(user_db)
-    db.commit()
-    db.refresh(user_db)
+    await db.commit()
     return {'message': 'created'}
 
 
 @auth_router.post('/login')
 async def login(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password):
+    db: AsyncSession = Depends(get_db)):
+    # Лимит проверяется до bcrypt, чтобы перебор не съедал пул хеширования
+    await check_login_rate(request, form_data.username)
+
+    user = await db.scalar(select(User).where(User.username == form_data.username))
+    valid, new_hash = await verify_password(form_data.password, user.password if user else None)
+    if not valid:
         raise HTTPException(status_code=401, detail="Маалымат туура эмес")
+    await login_limiter.reset(f'user:{form_data.username.lower()}')
 
-    access_token = create_access_token({"sub": user.username})
-    refresh_token = create_refresh_token({"sub": user.username})
+    # Хеш с устаревшей стоимостью заменяем, пока знаем пароль
+    if new_hash:
+        user.password = new_hash
 
-    new_token = RefreshToken(user_id=user.id, token=refresh_token)
-    db.add(new_token)
-    db.commit()
+    # Сессия живёт, пока обмениваются её refresh-токены; access-токены несут
+    # её id (sid), чтобы logout отзывал и их
+    session_id = uuid.uuid4().hex
+    access_token = create_access_token({**user_claims(user), 'sid': session_id})
+    refresh_token = create_refresh_token({'sub': str(user.id), 'sid': session_id})
 
-    return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
+    await store_refresh_token(db, user.id, refresh_token)
+    await db.commit()
 
+    return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
 
 
 @auth_router.post("/logout")
-def logout(refresh_token: str, db: Session = Depends(get_db)):
-    stored_token = db.query(RefreshToken).filter(
-        RefreshToken.token == refresh_token
-    ).first()
-
-    if not stored_token:
+async def logout(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    claims = decode_token(refresh_token, 'refresh', verify_exp=False)
+    if await consume_refresh_token(db, refresh_token) is None:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
+    await db.commit()
 
-    db.delete(stored_token)
-    db.commit()
+    # Access-токены этой сессии тоже перестают действовать
+    await auth_cache.revoke_session(claims['sid'])
 
     return {'message': 'Вышли'}
 
 @auth_router.post("/refresh")
-async def refresh(refresh_token: str, db: Session = Depends(get_db)):
-    token_entry = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-    if not token_entry:
+async def refresh(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    # Подпись и срок проверяются до базы
+    claims = decode_token(refresh_token, 'refresh')
+
+    # Ротация: старый токен удаляется, взамен выдаётся новый той же сессии
+    user_id = await consume_refresh_token(db, refresh_token)
+    if user_id is None:
         raise HTTPException(status_code=404, detail='Token not found')
 
-    access_token = create_access_token({'sub': token_entry.user_id})
+    user = await db.get(User, user_id)
+    if user is None:
+        raise credentials_exception
+    sid = claims['sid']
+    access_token = create_access_token({**user_claims(user), 'sid': sid})
+    new_refresh_token = create_refresh_token({'sub': str(user.id), 'sid': sid})
+    await store_refresh_token(db, user.id, new_refresh_token)
+    await db.commit()
+
+    return {'access_token': access_token, 'refresh_token': new_refresh_token, 'token_type': 'bearer'}
+
 
-    return {'access_token': access_token, 'token_type': 'bearer'}
\ No newline at end of file
+@auth_router.get('/me')
+async def me(user: CurrentUser = Depends(get_current_user)):
+    return user._asdict()
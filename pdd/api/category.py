@@ -1,53 +1,54 @@
 from fastapi import FastAPI, HTTPException, APIRouter, Depends, status
 from pdd.db.models import Category
 from pdd.db.schema import CategorySchema
-from pdd.db.database import SessionLocal
+from pdd.db.database import get_db
+from pdd.services.question_bank import questions_changed
+from pdd.services.http_cache import http_cache, data_versions
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
 category_router = APIRouter(prefix="/category", tags=["Category"])
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @category_router.post( "/", response_model=CategorySchema, status_code=status.HTTP_201_CREATED)
-def create_category(category: CategorySchema, db: Session = Depends(get_db)):
+async def create_category(category: CategorySchema, db: AsyncSession = Depends(get_db)):
     db_category = Category(category_name=category.category_name)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    await data_versions.bump('categories')
     return db_category
 
-@category_router.get('/', response_model=List[CategorySchema])
-def list_categories(db: Session = Depends(get_db)):
-    return db.query(Category).all()
+@category_router.get('/', response_model=List[CategorySchema], dependencies=[http_cache('categories')])
+async def list_categories(db: AsyncSession = Depends(get_db)):
+    return (await db.scalars(select(Category))).all()
 
-@category_router.get('/{category_id}/', response_model=CategorySchema)
-def get_categories(category_id: int, db: Session = Depends(get_db)):
-    db_categories = db.query(Category).filter(Category.id == category_id).first()
+@category_router.get('/{category_id}/', response_model=CategorySchema, dependencies=[http_cache('categories')])
+async def get_categories(category_id: int, db: AsyncSession = Depends(get_db)):
+    db_categories = await db.get(Category, category_id)
     if db_categories is None:
         raise HTTPException(status_code=404, detail='Category Not Found')
     return db_categories
 
 @category_router.put('/{category_id}/', response_model=dict)
-def update_categories(category_id: int, category: CategorySchema, db: Session = Depends(get_db)):
-    db_categories = db.query(Category).filter(Category.id == category_id).first()
+async def update_categories(category_id: int, category: CategorySchema, db: AsyncSession = Depends(get_db)):
+    db_categories = await db.get(Category, category_id)
     if db_categories is None:
         raise HTTPException(status_code=404, detail='Category Not Found')
     db_categories.category_name = category.category_name
-    db.commit()
+    await db.commit()
+    await data_versions.bump('categories')
+    await questions_changed()
     return {'message': 'Updated'}
 
 @category_router.delete('/{category_id}/', response_model=dict)
-def delete_categories(category_id: int, db: Session = Depends(get_db)):
-    db_categories = db.query(Category).filter(Category.id == category_id).first()
+async def delete_categories(category_id: int, db: AsyncSession = Depends(get_db)):
+    db_categories = await db.get(Category, category_id)
     if db_categories is None:
         raise HTTPException(status_code=404, detail='Category Not Found')
-    db.delete(db_categories)
-    db.commit()
+    await db.delete(db_categories)
+    await db.commit()
+    await data_versions.bump('categories')
+    await questions_changed()
     return {'message': 'Deleted'}
\ No newline at end of file
@@ -1,38 +1,181 @@
-from fastapi import FastAPI, HTTPException, APIRouter, Depends, status
-from pdd.db.models import Exam
-from pdd.db.schema import ExamSchema
-from pdd.db.database import SessionLocal
-from typing import List
+from fastapi import FastAPI, HTTPException, APIRouter, Depends, status, Query
+from pdd.db.models import Exam, ExamQuestion, ExamStatus, Question, Category, AnswerOption, User
+from pdd.db.schema import (ExamSchema, ExamCreate, ExamTicketResponse,
+                           ExamSubmit, ExamResultResponse)
+from pdd.db.database import get_db
+from pdd.db.config import EXAM_TICKET_SIZE, QUESTION_BANK_ENABLED
+from pdd.services.exam_pool import question_pool, NotEnoughQuestions
+from pdd.services.question_bank import question_bank
+from sqlalchemy import select, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Optional
 
 exam_router = APIRouter(prefix="/exam", tags=["Exam"])
 
-async def get_db():
-    db = SessionLocal()
+
+async def load_ticket(db: AsyncSession, exam: Exam) -> dict:
+    # Вопросы билета вместе с вариантами ответов одним запросом
+    rows = (await db.execute(
+        select(ExamQuestion.position, Question)
+        .join(Question, Question.id == ExamQuestion.question_id)
+        .where(ExamQuestion.exam_id == exam.id)
+        .options(joinedload(Question.answer_options))
+        .order_by(ExamQuestion.position)
+    )).unique().all()
+
+    questions = []
+    for _, question in rows:
+        questions.append({
+            "id": str(question.id),
+            "text": question.text,
+            "image": None,
+            "options": [{"id": str(opt.id), "text": opt.text}
+                        for opt in sorted(question.answer_options, key=lambda opt: opt.id)],
+        })
+
+    return {**ExamSchema.model_validate(exam).model_dump(), "questions": questions}
+
+
+@exam_router.post("/", response_model=ExamTicketResponse, status_code=201)
+async def create_exam(data: ExamCreate, db: AsyncSession = Depends(get_db)):
+    if await db.get(User, data.user_id) is None:
+        raise HTTPException(status_code=400, detail="Пользователь не найден")
+    if data.category_id is not None and await db.get(Category, data.category_id) is None:
+        raise HTTPException(status_code=400, detail="Категория не найдена")
+
     try:
-        yield db
-    finally:
-        db.close()
+        question_ids = await question_pool.sample(db, EXAM_TICKET_SIZE,
+                                                  data.category_id, data.difficulty)
+    except NotEnoughQuestions as e:
+        raise HTTPException(status_code=400,
+                            detail=f"Недостаточно вопросов для билета: {e.available} из {EXAM_TICKET_SIZE}")
+
+    exam = Exam(user_id=data.user_id, category_id=data.category_id, difficulty=data.difficulty)
+    db.add(exam)
+    await db.flush()
 
-@exam_router.post("/", response_model=ExamSchema, status_code=201)
-def create_exam():
-    return {"message": "POST /exam — создание экзамена"}
+    # Весь билет одним многострочным INSERT
+    await db.execute(insert(ExamQuestion), [
+        {"exam_id": exam.id, "question_id": question_id, "position": position}
+        for position, question_id in enumerate(question_ids, start=1)
+    ])
+    await db.commit()
+
+    return await load_ticket(db, exam)
 
 
 @exam_router.get("/", response_model=List[ExamSchema])
-def list_exams():
-    return [{"message": "GET /exam — список экзаменов"}]
+async def list_exams(
+    user_id: Optional[int] = Query(None),
+    size: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(Exam).order_by(Exam.started_at.desc()).limit(size)
+    if user_id is not None:
+        query = query.where(Exam.user_id == user_id)
+    return (await db.scalars(query)).all()
+
+
+@exam_router.get("/{exam_id}", response_model=ExamTicketResponse)
+async def get_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
+    exam = await db.get(Exam, exam_id)
+    if exam is None:
+        raise HTTPException(status_code=404, detail="Экзамен не найден")
+    return await load_ticket(db, exam)
+
+
+@exam_router.post("/{exam_id}/submit", response_model=ExamResultResponse)
+async def submit_exam(exam_id: int, data: ExamSubmit, db: AsyncSession = Depends(get_db)):
+    exam = await db.get(Exam, exam_id)
+    if exam is None:
+        raise HTTPException(status_code=404, detail="Экзамен не найден")
+    if exam.status == ExamStatus.FINISHED:
+        raise HTTPException(status_code=409, detail="Экзамен уже завершён")
+
+    ticket = (await db.execute(
+        select(ExamQuestion.id, ExamQuestion.question_id, Question.category_id)
+        .join(Question, Question.id == ExamQuestion.question_id)
+        .where(ExamQuestion.exam_id == exam_id)
+        .order_by(ExamQuestion.position)
+    )).all()
+
+    # Варианты и правильные ответы на весь билет: из банка вопросов или одним запросом
+    question_ids = [row.question_id for row in ticket]
+    if QUESTION_BANK_ENABLED:
+        keys = await question_bank.answer_keys(question_ids)
+    else:
+        options = (await db.execute(
+            select(AnswerOption.question_id, AnswerOption.id, AnswerOption.is_correct)
+            .where(AnswerOption.question_id.in_(question_ids))
+            .order_by(AnswerOption.id)
+        )).all()
+        option_ids, correct_ids = defaultdict(set), {}
+        for option in options:
+            option_ids[option.question_id].add(option.id)
+            if option.is_correct:
+                correct_ids.setdefault(option.question_id, option.id)
+        keys = {question_id: (correct_ids.get(question_id), frozenset(option_ids[question_id]))
+                for question_id in question_ids}
+    correct = {question_id: key[0] for question_id, key in keys.items()}
 
+    selected = {answer.question_id: answer.option_id for answer in data.answers}
+    unknown = selected.keys() - {row.question_id for row in ticket}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Вопросов {sorted(unknown)} нет в билете")
+    # Выбранный вариант должен относиться к своему вопросу
+    foreign = sorted(option_id for question_id, option_id in selected.items()
+                     if option_id not in keys.get(question_id, (None, frozenset()))[1])
+    if foreign:
+        raise HTTPException(status_code=400, detail=f"Варианты {foreign} не относятся к своим вопросам")
 
-@exam_router.get("/{exam_id}", response_model=ExamSchema)
-def get_exam(exam_id: int):
-    return {"id": exam_id, "message": "GET /exam/{exam_id} — просмотр экзамена"}
+    answers, rows = [], []
+    by_category = defaultdict(lambda: [0, 0])
+    for row in ticket:
+        option_id = selected.get(row.question_id)
+        is_correct = option_id is not None and option_id == correct.get(row.question_id)
+        by_category[row.category_id][0] += is_correct
+        by_category[row.category_id][1] += 1
+        rows.append({"id": row.id, "selected_option_id": option_id, "is_correct": is_correct})
+        answers.append({"question_id": row.question_id, "selected_option_id": option_id,
+                        "correct_option_id": correct.get(row.question_id), "is_correct": is_correct})
+    score = sum(answer["is_correct"] for answer in answers)
 
+    # Завершаем только если экзамен всё ещё идёт: повторная отправка не пересчитает балл
+    finished_at = datetime.utcnow()
+    finished = await db.scalar(
+        update(Exam)
+        .where(Exam.id == exam_id, Exam.status == ExamStatus.IN_PROGRESS)
+        .values(status=ExamStatus.FINISHED, score=score, finished_at=finished_at)
+        .returning(Exam.id)
+        .execution_options(synchronize_session=False)
+    )
+    if finished is None:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Экзамен уже завершён")
+    if rows:
+        await db.execute(update(ExamQuestion), rows)
+    await db.commit()
 
-@exam_router.put("/{exam_id}", response_model=dict)
-def update_exam(exam_id: int):
-    return {"id": exam_id, "message": "PUT /exam/{exam_id} — обновление экзамена"}
+    return {
+        "exam_id": exam_id,
+        "status": ExamStatus.FINISHED,
+        "score": score,
+        "total": len(ticket),
+        "finished_at": finished_at,
+        "categories": [{"category_id": category_id, "correct": values[0], "total": values[1]}
+                       for category_id, values in by_category.items()],
+        "answers": answers,
+    }
 
 
 @exam_router.delete("/{exam_id}", status_code=204)
-def delete_exam(exam_id: int):
-    return None
\ No newline at end of file
+async def delete_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
+    exam = await db.get(Exam, exam_id)
+    if exam is None:
+        raise HTTPException(status_code=404, detail="Экзамен не найден")
+    await db.delete(exam)
+    await db.commit()
+    return None
@@ -1,13 +1,58 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from PIL import Image
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Query
+from fastapi_pagination import Page
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Tuple
+import asyncio
+import hashlib
+from functools import partial
 import io
+import time
+import tarfile
+import zipfile
 import torch
-import torch.nn as nn
 import torch.nn.functional as F
-from torchvision import transforms
+from pdd.db.config import (
+    INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS,
+    INFERENCE_DECODE_WORKERS, INFERENCE_TORCH_THREADS,
+    INFERENCE_MAX_PENDING, PREDICT_BATCH_MAX_FILES,
+    PREDICT_MAX_UPLOAD_BYTES, PREDICT_MAX_ARCHIVE_BYTES,
+    MODEL_VERSION, PREDICT_CACHE_ENABLED, PREDICT_CACHE_TTL,
+    PREDICT_CACHE_LOCAL_SIZE, PREDICT_CACHE_LOCAL_TTL,
+    MODEL_VARIANT, PREDICTION_LOG_BATCH_SIZE,
+    PREDICTION_LOG_FLUSH_SECONDS, PREDICTION_LOG_MAX_BUFFER,
+    PREDICTION_LOG_ENABLED)
+from pdd.db.database import get_db
+from pdd.db.log_writer import PredictionLogWriter
+from pdd.db.models import AIPredictionLog
+from pdd.db.redis import cache_redis_client
+from pdd.db.schema import AIPredictionLogSchema
+from pdd.ml.batching import BatchingEngine
+from pdd.ml.cache import PredictionCache
+from pdd.ml.preprocess import decode_image
+from pdd.services.metrics import INFERENCE_STAGE
+from pdd.ml.runtime import LazyModel, select_device
+from pdd.ml.executor import InferenceExecutor, InferenceOverloaded
+from pdd.api.auth import get_optional_user
+from pdd.services.auth_cache import CurrentUser
 
 predict_router = APIRouter(prefix="/pdd", tags=["PDD"])
 
+
+IMAGE_CONTENT_TYPES = ("image/jpeg", "image/png")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+TAR_CONTENT_TYPES = ("application/x-tar", "application/gzip", "application/x-gzip",
+                     "application/x-gtar")
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# Лимиты на всё тело запроса (см. BodySizeLimitMiddleware), с запасом на заголовки multipart
+MULTIPART_OVERHEAD = 64 * 1024
+UPLOAD_LIMITS = {
+    "/pdd/predict": PREDICT_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    "/pdd/predict/batch": PREDICT_MAX_ARCHIVE_BYTES + MULTIPART_OVERHEAD,
+}
+
 SIGNS = {
     0: {
         "label": "BE CAREFUL, CHILDREN",
@@ -78,82 +123,240 @@ SIGNS = {
 }
 
 
-class CheckImage(nn.Module):
-    def __init__(self):
-        super().__init__()
-        self.first = nn.Sequential(
-            nn.Conv2d(3, 64, kernel_size=3, padding=1),
-            nn.BatchNorm2d(64),
-            nn.ReLU(),
-            nn.MaxPool2d(2),
+device = select_device(MODEL_VARIANT)
+
+
+model = LazyModel(MODEL_VARIANT, device)
+
+
+def forward_batch(batch: torch.Tensor) -> torch.Tensor:
+    started = time.perf_counter()
+    with torch.no_grad():
+        outputs = model(batch.to(device))
+        probabilities = F.softmax(outputs, dim=1).cpu()
+    INFERENCE_STAGE.labels("forward").observe(time.perf_counter() - started)
+    return probabilities
+
+
+def observe_stage(stage: str, seconds: float):
+    INFERENCE_STAGE.labels(stage).observe(seconds)
+
+
+# Выполняется в пуле декодирования; этапы замеряются отдельно
+timed_decode_image = partial(decode_image, observe=observe_stage)
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> Tuple[bytes, str]:
+    """Читает загрузку по частям, обрывая её на ``max_bytes``, и заодно считает sha256.
+
+    Это лимит на отдельный файл; всё тело запроса ограничивает ещё до
+    разбора multipart ``BodySizeLimitMiddleware`` по ``UPLOAD_LIMITS``.
+    """
+    if file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Файл {file.filename} слишком большой")
+
+    sha = hashlib.sha256()
+    buffer = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        if len(buffer) + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Файл {file.filename} слишком большой")
+        sha.update(chunk)
+        buffer += chunk
+    return bytes(buffer), sha.hexdigest()
+
 
-            nn.Conv2d(64, 128, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(2),
+def extract_archive(data: bytes, limit: int, max_member_bytes: int) -> List[Tuple[str, bytes, str]]:
+    # Выполняется в пуле декодирования, поэтому здесь же считается sha256 каждого файла
+    images = []
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                    if info.file_size > max_member_bytes:
+                        raise UploadTooLarge(info.filename)
+                    member_data = archive.read(info)
+                    images.append((info.filename, member_data, hashlib.sha256(member_data).hexdigest()))
+                    if len(images) > limit:
+                        break
+    else:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(IMAGE_EXTENSIONS):
+                    if member.size > max_member_bytes:
+                        raise UploadTooLarge(member.name)
+                    member_data = archive.extractfile(member).read()
+                    images.append((member.name, member_data, hashlib.sha256(member_data).hexdigest()))
+                    if len(images) > limit:
+                        break
+    return sorted(images, key=lambda item: item[0])
 
-            nn.Conv2d(128, 256, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(2),
 
-            nn.Conv2d(256, 512, kernel_size=3, padding=1),
-            nn.ReLU(),
-            nn.MaxPool2d(2),
-        )
-        self.second = nn.Sequential(
-            nn.Flatten(),
-            nn.Linear(512 * 8 * 8, 1024),
-            nn.ReLU(),
-            nn.Linear(1024, 11)
-        )
+def format_prediction(probabilities: torch.Tensor) -> dict:
+    class_id = probabilities.argmax().item()
+    confidence = probabilities[class_id].item()
+    sign = SIGNS[class_id]
+    return {
+        "label": sign["label"],
+        "category": sign["category"],
+        "description": sign["description"],
+        "confidence": round(confidence * 100, 2),
+    }
+
+
+executor = InferenceExecutor(decode_workers=INFERENCE_DECODE_WORKERS,
+                             max_pending=INFERENCE_MAX_PENDING,
+                             torch_threads=INFERENCE_TORCH_THREADS)
 
-    def forward(self, x):
-        x = self.first(x)
-        x = self.second(x)
-        return x
+engine = BatchingEngine(forward_batch,
+                        max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+                        max_wait_ms=INFERENCE_MAX_WAIT_MS,
+                        executor=executor.model_pool)
 
 
-transform_data = transforms.Compose([
-    transforms.Resize((128,128)),
-    transforms.ToTensor()
-])
+async def warmup():
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor.model_pool, model.warmup,
+                               sorted({1, INFERENCE_MAX_BATCH_SIZE}))
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+cache = PredictionCache(cache_redis_client,
+                        model_version=f"{MODEL_VERSION}-{MODEL_VARIANT}",
+                        ttl=PREDICT_CACHE_TTL,
+                        local_size=PREDICT_CACHE_LOCAL_SIZE,
+                        local_ttl=PREDICT_CACHE_LOCAL_TTL)
 
-model = CheckImage()
-model.load_state_dict(torch.load('pdd_model.pth', map_location=device))
-model.to(device)
-model.eval()
+log_writer = PredictionLogWriter(batch_size=PREDICTION_LOG_BATCH_SIZE,
+                                 flush_interval=PREDICTION_LOG_FLUSH_SECONDS,
+                                 max_buffer=PREDICTION_LOG_MAX_BUFFER)
 
 
+def log_prediction(result: dict, digest: str, user_id: Optional[int] = None):
+    if PREDICTION_LOG_ENABLED and "label" in result:
+        log_writer.log(predicted_label=result["label"],
+                       confidence=result["confidence"],
+                       image_url=f"sha256:{digest}",
+                       user_id=user_id)
+
 
 @predict_router.post("/predict")
-async def predict(file: UploadFile = File(...)):
+async def predict(file: UploadFile = File(...),
+                  user: Optional[CurrentUser] = Depends(get_optional_user)):
     try:
-        if file.content_type not in ("image/jpeg", "image/png"):
+        if file.content_type not in IMAGE_CONTENT_TYPES:
             raise HTTPException(status_code=400, detail="Формат файла должен быть jpg или png")
 
-        image_bytes = await file.read()
+        image_bytes, digest = await read_upload(file, PREDICT_MAX_UPLOAD_BYTES)
         if not image_bytes:
             raise HTTPException(status_code=400, detail="Файл не загружен")
 
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-        image_tensor = transform_data(image).unsqueeze(0).to(device)
-
-        with torch.no_grad():
-            outputs = model(image_tensor)
-            probabilities = F.softmax(outputs, dim=1)
-            class_id = probabilities.argmax(dim=1).item()
-            confidence = probabilities[0][class_id].item()
+        if PREDICT_CACHE_ENABLED:
+            cached = await cache.get(digest)
+            if cached is not None:
+                log_prediction(cached, digest, user.id if user else None)
+                return cached
 
-        sign = SIGNS[class_id]
+        async with executor.slot():
+            image_tensor = await executor.decode(timed_decode_image, image_bytes)
+            probabilities = await engine.submit(image_tensor)
 
-        return {
-            "label": sign["label"],
-            "category": sign["category"],
-            "description": sign["description"],
-            "confidence": round(confidence * 100,2),
-        }
+        result = format_prediction(probabilities)
+        if PREDICT_CACHE_ENABLED:
+            await cache.set(digest, result)
+        log_prediction(result, digest, user.id if user else None)
+        return result
 
+    except HTTPException:
+        raise
+    except InferenceOverloaded:
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте позже",
+                            headers={"Retry-After": "1"})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@predict_router.post("/predict/batch")
+async def predict_batch(files: List[UploadFile] = File(...),
+                        user: Optional[CurrentUser] = Depends(get_optional_user)):
+    # (имя, байты, sha256): хэш считается при чтении загрузки или распаковке в пуле
+    images: List[Tuple[str, bytes, str]] = []
+    for file in files:
+        if file.content_type in IMAGE_CONTENT_TYPES:
+            data, digest = await read_upload(file, PREDICT_MAX_UPLOAD_BYTES)
+            if not data:
+                raise HTTPException(status_code=400, detail=f"Файл {file.filename} пустой")
+            images.append((file.filename, data, digest))
+        elif file.content_type in ZIP_CONTENT_TYPES + TAR_CONTENT_TYPES:
+            data, _ = await read_upload(file, PREDICT_MAX_ARCHIVE_BYTES)
+            try:
+                images.extend(await executor.decode(extract_archive, data, PREDICT_BATCH_MAX_FILES,
+                                                    PREDICT_MAX_UPLOAD_BYTES))
+            except UploadTooLarge as e:
+                raise HTTPException(status_code=413, detail=f"Файл {e} в архиве слишком большой")
+            except (zipfile.BadZipFile, tarfile.TarError):
+                raise HTTPException(status_code=400, detail=f"Не удалось распаковать архив {file.filename}")
+        else:
+            raise HTTPException(status_code=400,
+                                detail=f"{file.filename}: формат должен быть jpg, png, zip или tar")
+        if len(images) > PREDICT_BATCH_MAX_FILES:
+            raise HTTPException(status_code=400,
+                                detail=f"Не больше {PREDICT_BATCH_MAX_FILES} изображений за запрос")
+
+    if not images:
+        raise HTTPException(status_code=400, detail="Файл не загружен")
+
+    digests = [digest for _, _, digest in images]
+    results = await cache.get_many(digests) if PREDICT_CACHE_ENABLED else [None] * len(images)
+    pending = [i for i, result in enumerate(results) if result is None]
+
+    try:
+        async with executor.slot(len(pending)):
+            decoded = await asyncio.gather(
+                *(executor.decode(timed_decode_image, images[i][1]) for i in pending),
+                return_exceptions=True,
+            )
+            tensors = [tensor for tensor in decoded if isinstance(tensor, torch.Tensor)]
+            outputs = iter(await engine.run_batch(torch.stack(tensors)) if tensors else [])
+    except InferenceOverloaded:
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте позже",
+                            headers={"Retry-After": "1"})
+
+    computed = {}
+    for i, tensor in zip(pending, decoded):
+        if isinstance(tensor, torch.Tensor):
+            results[i] = format_prediction(next(outputs))
+            computed[digests[i]] = results[i]
+        else:
+            results[i] = {"error": "Не удалось прочитать изображение"}
+    if PREDICT_CACHE_ENABLED:
+        await cache.set_many(computed)
+
+    for result, digest in zip(results, digests):
+        log_prediction(result, digest, user.id if user else None)
+
+    return {"items": [{"filename": filename, **result}
+                      for (filename, _, _), result in zip(images, results)]}
+
+
+@predict_router.get("/logs", response_model=Page[AIPredictionLogSchema])
+async def prediction_logs(
+    user_id: Optional[int] = Query(None),
+    label: Optional[str] = Query(None, description="Например STOP или GIVE WAY"),
+    db: AsyncSession = Depends(get_db),
+):
+    query = select(AIPredictionLog).order_by(AIPredictionLog.created_at.desc(), AIPredictionLog.id.desc())
+    if user_id is not None:
+        query = query.where(AIPredictionLog.user_id == user_id)
+    if label:
+        query = query.where(AIPredictionLog.predicted_label == label.upper())
+    return await paginate(db, query)
+
+
+@predict_router.get("/stats")
+async def predict_stats():
+    return {**engine.stats(), "model_loaded": model.loaded,
+            "executor": executor.stats(), "cache": cache.stats(),
+            "logs": log_writer.stats()}
\ No newline at end of file
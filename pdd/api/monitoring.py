@@ -0,0 +1,43 @@
+from fastapi import APIRouter, Response
+from pdd.db.database import pool_stats
+from pdd.services.question_bank import question_bank
+from pdd.services.passwords import password_hasher
+from pdd.services.auth_cache import auth_cache
+from pdd.services.refresh_tokens import token_purger
+from pdd.services.metrics import render, CONTENT_TYPE_LATEST
+
+
+monitoring_router = APIRouter(prefix='/monitoring', tags=['Monitoring'])
+metrics_router = APIRouter(tags=['Monitoring'])
+
+
+@metrics_router.get('/metrics', include_in_schema=False)
+async def prometheus_metrics():
+    return Response(render(), media_type=CONTENT_TYPE_LATEST)
+
+
+@monitoring_router.get('/db')
+async def db_pool_stats():
+    return pool_stats()
+
+
+@monitoring_router.get('/question-bank')
+async def question_bank_stats():
+    return question_bank.stats()
+
+
+@monitoring_router.get('/passwords')
+async def password_hasher_stats():
+    return password_hasher.stats()
+
+
+
+@monitoring_router.get('/auth-cache')
+async def auth_cache_stats():
+    return auth_cache.stats()
+
+
+
+@monitoring_router.get('/refresh-tokens')
+async def refresh_token_stats():
+    return token_purger.stats()
@@ -1,51 +1,88 @@
-from fastapi import APIRouter, HTTPException, status, Query,Depends
-from fastapi_pagination import Page, paginate, Params
-from sqlalchemy.orm import Session, selectinload
-from sqlalchemy import select
+from fastapi import APIRouter, HTTPException, status, Query,Depends, UploadFile, File
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.attributes import flag_modified
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from typing import Optional, List
-from pdd.db.database import SessionLocal
+import codecs
+from pdd.db.database import get_db
+from pdd.db.config import QUESTION_BANK_ENABLED
+from pdd.services.question_bank import question_bank, questions_changed
+from pdd.services.http_cache import http_cache
+from pdd.services.question_import import (FORMATS, ImportFormatError, detect_format,
+                                          export_questions, import_questions, insert_questions, read_rows)
 from pdd.db.models import Question, AnswerOption, Category, QuestionDifficulty
-from pdd.db.schema import QuestionDifficulty, AnswerOptionOut, AnswerOptionCreate, QuestionCreate,QuestionDetailResponse,QuestionListResponse, QuestionListItem
-
-
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from pdd.db.schema import QuestionDifficulty, AnswerOptionOut, AnswerOptionCreate, QuestionCreate, QuestionUpdate,QuestionDetailResponse,QuestionListResponse, QuestionListItem
 
 
 question_router = APIRouter(prefix="/questions", tags=["Questions PDD"])
 
+# При включённом банке ответ собирается из него, поэтому и ETag считается
+# по версии банка, а не по отдельно кэшируемой data_versions
+questions_cache = http_cache("questions", version=question_bank.etag_version if QUESTION_BANK_ENABLED else None)
+
 
 # === Получение списка вопросов (доступно всем) ===
-@question_router.get("", response_model=QuestionListResponse)
-def get_questions(
+# Keyset-пагинация: следующая страница запрашивается с after_id = next_after_id,
+# поэтому глубокие страницы стоят столько же, сколько первая
+@question_router.get("", response_model=QuestionListResponse, dependencies=[questions_cache])
+async def get_questions(
     category: Optional[str] = Query(None, description="Категория, например A или B"),
     difficulty: Optional[str] = Query(None, description="easy, medium, advanced"),
-    params: Params = Params(),
-    db: Session = Depends(get_db),
+    after_id: Optional[int] = Query(None, description="id последнего вопроса предыдущей страницы"),
+    size: int = Query(20, ge=1, le=100),
+    with_total: bool = Query(False, description="Посчитать общее количество вопросов по фильтру"),
+    db: AsyncSession = Depends(get_db),
 ):
-    query = select(Question).options(selectinload(Question.answer_options))
-
-    if category:
-        query = query.join(Category).where(Category.category_name == category)
-
+    level = None
     if difficulty:
         try:
-            diff = QuestionDifficulty[difficulty.lower()]
-            query = query.where(Question.difficulty == diff)
-        except KeyError:
+            level = QuestionDifficulty(difficulty.lower())
+        except ValueError:
             raise HTTPException(
                 status_code=400,
                 detail="Неверное значение difficulty. Доступно: easy, medium, advanced"
             )
 
-    result = paginate(db, query, params=params)
+    if QUESTION_BANK_ENABLED:
+        records, has_next, total = await question_bank.page(category or None, level, after_id, size)
+        return {
+            "items": [{
+                "id": str(q.id),
+                "text": q.text,
+                "image": None,
+                "options": [{"id": str(option_id), "text": text} for option_id, text in q.options],
+            } for q in records],
+            "next_after_id": str(records[-1].id) if has_next else None,
+            "total": total if with_total else None,
+        }
+
+    filters = []
+    if category:
+        category_id = select(Category.id).where(Category.category_name == category).scalar_subquery()
+        filters.append(Question.category_id == category_id)
+    if level:
+        filters.append(Question.difficulty == level)
+
+    query = (
+        select(Question)
+        .where(*filters)
+        .options(selectinload(Question.answer_options))
+        .order_by(Question.id)
+        .limit(size + 1)
+    )
+    if after_id is not None:
+        query = query.where(Question.id > after_id)
+
+    questions = (await db.scalars(query)).all()
+    has_next = len(questions) > size
+    questions = questions[:size]
 
     items = []
-    for q in result.items:
+    for q in questions:
         options = [{"id": str(opt.id), "text": opt.text} for opt in q.answer_options]
         items.append({
             "id": str(q.id),
@@ -54,13 +91,75 @@ def get_questions(
             "options": options
         })
 
-    return {"items": items}
+    total = None
+    if with_total:
+        total = await db.scalar(select(func.count(Question.id)).where(*filters))
+
+    return {
+        "items": items,
+        "next_after_id": str(questions[-1].id) if has_next else None,
+        "total": total,
+    }
+
+
+# === Экспорт банка вопросов потоком (JSONL или CSV) ===
+@question_router.get("/export")
+async def export_question_bank(format: str = Query("jsonl", description="jsonl или csv")):
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail="Неверный формат. Доступно: jsonl, csv")
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        export_questions(format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="questions.{format}"'},
+    )
+
+
+# === Массовый импорт вопросов из JSONL или CSV ===
+@question_router.post("/import")
+async def import_question_bank(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="jsonl или csv, по умолчанию — по расширению файла"),
+    db: AsyncSession = Depends(get_db),
+):
+    fmt = format or detect_format(file.filename)
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="Неверный формат. Доступно: jsonl, csv")
+
+    # Строки декодируются сами: TextIOWrapper поверх SpooledTemporaryFile
+    # до Python 3.11 не работает (нет readable/seekable/read1)
+    source = codecs.iterdecode(file.file, "utf-8-sig")
+    try:
+        report = await import_questions(db, read_rows(source, fmt))
+    except ImportFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Файл должен быть в кодировке UTF-8")
+
+    if report["imported"]:
+        await questions_changed()
+    return report
 
 
 # === Детальная информация о вопросе (доступно всем) ===
-@question_router.get("/{question_id}", response_model=QuestionDetailResponse)
-def get_question_detail(question_id: int, db: Session = Depends(get_db)):
-    question = db.get(Question, question_id, options=[selectinload(Question.answer_options)])
+@question_router.get("/{question_id}", response_model=QuestionDetailResponse,
+                     dependencies=[questions_cache])
+async def get_question_detail(question_id: int, db: AsyncSession = Depends(get_db)):
+    if QUESTION_BANK_ENABLED:
+        record = await question_bank.get(question_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Вопрос не найден")
+        if record.correct_option_id is None:
+            raise HTTPException(status_code=500, detail="У вопроса нет правильного ответа")
+        return QuestionDetailResponse(
+            id=str(record.id),
+            text=record.text,
+            explanation=record.explanation,
+            correct_option_id=str(record.correct_option_id),
+            version=record.version
+        )
+
+    question = await db.get(Question, question_id, options=[selectinload(Question.answer_options)])
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
 
@@ -72,82 +171,101 @@ def get_question_detail(question_id: int, db: Session = Depends(get_db)):
         id=str(question.id),
         text=question.text,
         explanation=question.explanation,
-        correct_option_id=str(correct_option.id)
+        correct_option_id=str(correct_option.id),
+        version=question.version
     )
 
 
 # === Создание вопроса (доступно всем, без авторизации) ===
 @question_router.post("/", status_code=status.HTTP_201_CREATED)
-def create_question(data: QuestionCreate, db: Session = Depends(get_db)):
+async def create_question(data: QuestionCreate, db: AsyncSession = Depends(get_db)):
     # Проверяем существование категории
-    category = db.get(Category, data.category_id)
+    category = await db.get(Category, data.category_id)
     if not category:
         raise HTTPException(status_code=400, detail="Категория не найдена")
 
-    # Создаём вопрос
-    question = Question(
-        text=data.text,
-        difficulty=data.difficulty,
-        explanation=data.explanation,
-        category_id=data.category_id
-    )
-    db.add(question)
-    db.commit()
-    db.refresh(question)
+    # Вопрос и варианты ответов одной транзакцией
+    question_id, = await insert_questions(db, [data])
+    await db.commit()
+    await questions_changed()
 
-    # Добавляем варианты ответов
-    for opt in data.answer_options:
-        answer_option = AnswerOption(
-            text=opt.text,
-            is_correct=opt.is_correct,
-            question_id=question.id
-        )
-        db.add(answer_option)
-
-    db.commit()
-    db.refresh(question)
-
-    return {"message": "Вопрос успешно создан", "question_id": question.id}
+    return {"message": "Вопрос успешно создан", "question_id": question_id}
 
 
 # === Обновление вопроса (доступно всем) ===
+# Варианты ответов сравниваются с текущими: меняются только отличающиеся строки,
+# id сохранившихся вариантов не меняются (на них ссылаются ответы в экзаменах)
 @question_router.put("/{question_id}")
-def update_question(question_id: int, data: QuestionCreate, db: Session = Depends(get_db)):
-    question = db.get(Question, question_id)
+async def update_question(question_id: int, data: QuestionUpdate, db: AsyncSession = Depends(get_db)):
+    question = await db.get(Question, question_id, options=[selectinload(Question.answer_options)])
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
+    if data.version is not None and data.version != question.version:
+        raise HTTPException(status_code=409, detail="Вопрос уже изменён, обновите данные и повторите")
+    if data.category_id != question.category_id and await db.get(Category, data.category_id) is None:
+        raise HTTPException(status_code=400, detail="Категория не найдена")
 
-    # Обновляем основные поля
-    question.text = data.text
-    question.difficulty = data.difficulty
-    question.explanation = data.explanation
-    question.category_id = data.category_id
+    existing = {opt.id: opt for opt in question.answer_options}
+    incoming_ids = [opt.id for opt in data.answer_options if opt.id is not None]
+    if len(incoming_ids) != len(set(incoming_ids)):
+        raise HTTPException(status_code=400, detail="Вариант ответа указан дважды")
+    unknown = set(incoming_ids) - existing.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Варианты {sorted(unknown)} не относятся к вопросу")
 
-    # Удаляем старые варианты ответов
-    db.query(AnswerOption).filter(AnswerOption.question_id == question_id).delete()
+    question_changed = False
+    for field in ("text", "difficulty", "explanation", "category_id"):
+        value = getattr(data, field)
+        if getattr(question, field) != value:
+            setattr(question, field, value)
+            question_changed = True
 
-    # Добавляем новые
+    options_changed = len(incoming_ids) != len(existing)
+    options = []
     for opt in data.answer_options:
-        answer_option = AnswerOption(
-            text=opt.text,
-            is_correct=opt.is_correct,
-            question_id=question.id
-        )
-        db.add(answer_option)
+        if opt.id is None:
+            options.append(AnswerOption(text=opt.text, is_correct=opt.is_correct))
+            options_changed = True
+            continue
+        answer_option = existing[opt.id]
+        if answer_option.text != opt.text or answer_option.is_correct != opt.is_correct:
+            answer_option.text = opt.text
+            answer_option.is_correct = opt.is_correct
+            options_changed = True
+        options.append(answer_option)
 
-    db.commit()
-    db.refresh(question)
+    if not question_changed and not options_changed:
+        return {"message": "Вопрос не изменился", "version": question.version}
 
-    return {"message": "Вопрос успешно обновлён"}
+    # Удалённые варианты уходят через delete-orphan
+    question.answer_options = options
+    if not question_changed:
+        # Правка одних вариантов тоже должна поднять версию вопроса
+        flag_modified(question, "text")
+
+    try:
+        await db.commit()
+    except StaleDataError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Вопрос уже изменён, обновите данные и повторите")
+    await questions_changed()
+
+    return {"message": "Вопрос успешно обновлён", "version": question.version}
 
 
 # === Удаление вопроса (доступно всем) ===
 @question_router.delete("/{question_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_question(question_id: int, db: Session = Depends(get_db)):
-    question = db.get(Question, question_id)
+async def delete_question(question_id: int, db: AsyncSession = Depends(get_db)):
+    question = await db.get(Question, question_id)
     if not question:
         raise HTTPException(status_code=404, detail="Вопрос не найден")
 
-    db.delete(question)
-    db.commit()
+    # Вопросы из билетов не удаляются: на них держится история экзаменов
+    await db.delete(question)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Вопрос используется в экзаменах, удалить его нельзя")
+    await questions_changed()
     return None
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import func, literal, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from pdd.db.database import get_db
+from pdd.db.models import Question, Video, QuestionDifficulty
+from pdd.db.schema import QuestionSearchResponse, VideoSearchResponse
+from pdd.services.http_cache import http_cache
+
+
+search_router = APIRouter(prefix="/search", tags=["Search"])
+
+
+def ts_query(q: str):
+    # Те же две конфигурации, что и в триггерах search_vector
+    return func.websearch_to_tsquery('russian', q).op('||')(func.websearch_to_tsquery('simple', q))
+
+
+def ranked(search_vector, fuzzy_column, q: str):
+    """Совпадение по словам (GIN по search_vector) или по триграммам (опечатки).
+
+    Ранг — ts_rank_cd плюс похожесть строки, чтобы точные совпадения шли выше нечётких.
+    """
+    query = ts_query(q)
+    rank = (func.ts_rank_cd(search_vector, query) + func.word_similarity(q, fuzzy_column)).label('rank')
+    condition = or_(search_vector.op('@@')(query), literal(q).op('<%')(fuzzy_column))
+    return rank, condition
+
+
+def page_of(rows, page: int, size: int) -> dict:
+    return {"items": rows[:size], "page": page, "size": size, "has_next": len(rows) > size}
+
+
+# === Поиск по вопросам: по тексту и пояснению ===
+@search_router.get("/questions", response_model=QuestionSearchResponse,
+                   dependencies=[http_cache("questions")])
+async def search_questions(
+    q: str = Query(..., min_length=2, max_length=200),
+    category_id: Optional[int] = Query(None),
+    difficulty: Optional[QuestionDifficulty] = Query(None),
+    page: int = Query(1, ge=1, le=50),
+    size: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    rank, condition = ranked(Question.search_vector, Question.text, q)
+    query = (
+        select(Question.id, Question.text, Question.explanation,
+               Question.category_id, Question.difficulty, rank)
+        .where(condition)
+        .order_by(rank.desc(), Question.id)
+        .offset((page - 1) * size)
+        .limit(size + 1)
+    )
+    if category_id is not None:
+        query = query.where(Question.category_id == category_id)
+    if difficulty is not None:
+        query = query.where(Question.difficulty == difficulty)
+
+    rows = [{**row._mapping, "id": str(row.id)} for row in (await db.execute(query)).all()]
+    return page_of(rows, page, size)
+
+
+# === Поиск по видеоурокам: по названию и описанию ===
+@search_router.get("/videos", response_model=VideoSearchResponse,
+                   dependencies=[http_cache("videos")])
+async def search_videos(
+    q: str = Query(..., min_length=2, max_length=200),
+    page: int = Query(1, ge=1, le=50),
+    size: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    rank, condition = ranked(Video.search_vector, Video.title, q)
+    query = (
+        select(Video.id, Video.title, Video.description, Video.url, rank)
+        .where(condition)
+        .order_by(rank.desc(), Video.id)
+        .offset((page - 1) * size)
+        .limit(size + 1)
+    )
+
+    rows = [dict(row._mapping) for row in (await db.execute(query)).all()]
+    return page_of(rows, page, size)
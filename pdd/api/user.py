@@ -1,31 +1,111 @@
 from pdd.db.models import User
 from pdd.db.schema import *
-from pdd.db.database import SessionLocal
-from sqlalchemy.orm import Session
-from fastapi import Depends, HTTPException, APIRouter
-from typing import  List
+from pdd.db.database import get_db, SessionLocal
+from pdd.services.auth_cache import auth_cache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import Depends, HTTPException, APIRouter, Query
+from fastapi.responses import StreamingResponse
+from datetime import datetime
+from typing import Optional
+import csv
+import io
+import json
 
 
 
 user_router = APIRouter(prefix='/user', tags=['User'])
 
-async def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+USER_EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+USER_EXPORT_FIELDS = ['id', 'email', 'username', 'created_at']
 
 
 
-@user_router.get('/', response_model=List[UserSchema])
-async def user_list(db: Session = Depends(get_db)):
-    return db.query(User).all()
+def user_filters(created_from: Optional[datetime], created_to: Optional[datetime],
+                 email_prefix: Optional[str]) -> list:
+    filters = []
+    if created_from is not None:
+        filters.append(User.created_at >= created_from)
+    if created_to is not None:
+        filters.append(User.created_at < created_to)
+    if email_prefix:
+        # LIKE 'prefix%' идёт по индексу ix_users_email_pattern
+        filters.append(User.email.startswith(email_prefix, autoescape=True))
+    return filters
+
+
+# Keyset-пагинация по id, как у списка вопросов
+@user_router.get('/', response_model=UserListResponse)
+async def user_list(
+    after_id: Optional[int] = Query(None, description='id последнего пользователя предыдущей страницы'),
+    size: int = Query(50, ge=1, le=500),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    email_prefix: Optional[str] = Query(None, max_length=255),
+    db: AsyncSession = Depends(get_db),
+):
+    query = (
+        select(User)
+        .where(*user_filters(created_from, created_to, email_prefix))
+        .order_by(User.id)
+        .limit(size + 1)
+    )
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+
+    users = (await db.scalars(query)).all()
+    has_next = len(users) > size
+    users = users[:size]
+    return {'items': users, 'next_after_id': users[-1].id if has_next else None}
+
+
+async def export_users(fmt: str, filters: list, batch_size: int = 1000):
+    # Своя сессия: генератор работает уже после выхода из get_db
+    async with SessionLocal() as db:
+        result = await db.stream(
+            select(User.id, User.email, User.username, User.created_at)
+            .where(*filters)
+            .order_by(User.id)
+            .execution_options(yield_per=batch_size)
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if fmt == 'csv':
+            writer.writerow(USER_EXPORT_FIELDS)
+        async for rows in result.partitions():
+            for row in rows:
+                if fmt == 'csv':
+                    writer.writerow([row.id, row.email, row.username, row.created_at.isoformat()])
+                else:
+                    buffer.write(json.dumps({'id': row.id, 'email': row.email, 'username': row.username,
+                                             'created_at': row.created_at.isoformat()},
+                                            ensure_ascii=False) + '\n')
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+@user_router.get('/export')
+async def user_export(
+    format: str = Query('ndjson', description='ndjson или csv'),
+    created_from: Optional[datetime] = Query(None),
+    created_to: Optional[datetime] = Query(None),
+    email_prefix: Optional[str] = Query(None, max_length=255),
+):
+    if format not in USER_EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail='Неверный формат. Доступно: ndjson, csv')
+    return StreamingResponse(
+        export_users(format, user_filters(created_from, created_to, email_prefix)),
+        media_type=USER_EXPORT_FORMATS[format],
+        headers={'Content-Disposition': f'attachment; filename="users.{format}"'},
+    )
 
 
 @user_router.get('/{user_id}', response_model=UserSchema)
-async def user_detail(user_id: int,db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id==user_id).first()
+async def user_detail(user_id: int,db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=400, detail='Пользователь не найден')
     return user
@@ -33,24 +113,27 @@ async def user_detail(user_id: int,db: Session = Depends(get_db)):
 
 @user_router.put('/{user_id}', response_model=UserSchema)
 async def user_update(user_id: int, user: UserSchema,
-                          db: Session = Depends(get_db)):
-    user_db = db.query(User).filter(User.id == User.id).first()
+                          db: AsyncSession = Depends(get_db)):
+    user_db = await db.get(User, user_id)
     if user_db is None:
         raise HTTPException(status_code=400, detail='Пользователь не найден')
     for user_key, user_value in user.dict().items():
         setattr(user_db, user_key, user_value)
     db.add(user_db)
-    db.commit()
-    db.refresh(user_db)
+    await db.commit()
+    await db.refresh(user_db)
+    # В выданных токенах старые username/email — пусть войдёт заново
+    await auth_cache.revoke_user(user_id)
     return user_db
 
 
 @user_router.delete('/{user_id}')
-async def user_delete(user_id: int, db: Session = Depends(get_db)):
-    user_db = db.query(User).filter(User.id == user_id).first()
+async def user_delete(user_id: int, db: AsyncSession = Depends(get_db)):
+    user_db = await db.get(User, user_id)
     if user_db is None:
         raise HTTPException(status_code=404, detail='Пользователь не найден')
 
-    db.delete(user_db)
-    db.commit()
+    await db.delete(user_db)
+    await db.commit()
+    await auth_cache.revoke_user(user_id)
     return {'message': 'Этот пользователь удален'}
\ No newline at end of file
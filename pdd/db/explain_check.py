@@ -0,0 +1,155 @@
+"""Проверка, что горячие запросы роутеров идут по индексам.
+
+Наполняет базу тестовыми данными внутри транзакции, делает ANALYZE и
+прогоняет EXPLAIN для запросов в той же форме, что строят роутеры.
+В конце транзакция откатывается, база остаётся как была.
+
+    alembic upgrade head
+    DB_URL=postgresql+asyncpg://... python -m pdd.db.explain_check
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+from typing import Iterator, List
+
+from sqlalchemy import func, literal, or_, select, text
+from sqlalchemy.dialects import postgresql
+
+from .database import engine
+from .models import (
+    AIPredictionLog, AnswerOption, Exam,
+    Question, QuestionDifficulty, RefreshToken, User)
+
+SEED = """
+INSERT INTO categories (id, category_name)
+SELECT g, 'explain_' || g FROM generate_series(900001, 900000 + :categories) g;
+
+INSERT INTO users (id, email, username, password, created_at)
+SELECT g, 'explain_' || g || '@example.com', 'explain_' || g, 'x', now()
+FROM generate_series(900001, 900000 + :users) g;
+
+INSERT INTO questions (id, text, difficulty, explanation, category_id)
+SELECT g, 'question ' || g,
+       (ARRAY['EASY', 'MEDIUM', 'ADVANCED'])[1 + g % 3]::questiondifficulty,
+       NULL, 900001 + g % :categories
+FROM generate_series(900001, 900000 + :questions) g;
+
+INSERT INTO answer_options (text, is_correct, question_id)
+SELECT 'option ' || o, o = 1, q
+FROM generate_series(900001, 900000 + :questions) q, generate_series(1, 4) o;
+
+INSERT INTO refresh_token (token_hash, created_date, expires_at, user_id)
+SELECT encode(sha256(convert_to('explain_' || g, 'UTF8')), 'hex'), now(),
+       now() + g * interval '1 minute' - interval '10 minutes', 900001 + g % :users
+FROM generate_series(1, :users * 3) g;
+
+INSERT INTO exams (score, status, started_at, user_id, question_id)
+SELECT 0, 'FINISHED', now() - g * interval '1 minute', 900001 + g % :users, 900001 + g % :questions
+FROM generate_series(1, :users * 5) g;
+
+INSERT INTO ai_prediction_logs (image_url, predicted_label, confidence, created_at, user_id)
+SELECT 'sha256:' || g, (ARRAY['STOP', 'GIVE WAY', 'PARKING'])[1 + g % 3], 99.0,
+       now() - g * interval '1 second', 900001 + g % :users
+FROM generate_series(1, :users * 20) g;
+
+ANALYZE categories, users, questions, answer_options, refresh_token, exams, ai_prediction_logs;
+"""
+
+INDEX_NODES = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+
+def router_queries():
+    question_ids = list(range(900001, 900021))
+    return [
+        ('questions: category + difficulty', 'ix_questions_category_difficulty_id',
+         select(Question)
+         .where(Question.category_id == 900002, Question.difficulty == QuestionDifficulty.MEDIUM,
+                Question.id > 900100)
+         .order_by(Question.id).limit(21)),
+        ('questions: difficulty only', 'ix_questions_difficulty_id',
+         select(Question)
+         .where(Question.difficulty == QuestionDifficulty.EASY, Question.id > 900100)
+         .order_by(Question.id).limit(21)),
+        ('questions: full-text search', 'ix_questions_search_vector',
+         select(Question.id)
+         .where(or_(Question.search_vector.op('@@')(func.websearch_to_tsquery('simple', 'question 900123')),
+                    literal('question 900123').op('<%')(Question.text)))
+         .limit(21)),
+        ('answer options selectinload', 'ix_answer_options_question_id',
+         select(AnswerOption).where(AnswerOption.question_id.in_(question_ids))),
+        ('refresh tokens of user', 'ix_refresh_token_user_id',
+         select(RefreshToken).where(RefreshToken.user_id == 900003)),
+        ('refresh token by hash', 'ix_refresh_token_token_hash',
+         select(RefreshToken.user_id).where(RefreshToken.token_hash == 'explain')),
+        ('expired refresh tokens purge', 'ix_refresh_token_expires_at',
+         select(RefreshToken.id).where(RefreshToken.expires_at < datetime.utcnow()).limit(1000)),
+        ('users by email prefix', 'ix_users_email_pattern',
+         select(User).where(User.email.startswith('explain_9012', autoescape=True))
+         .order_by(User.id).limit(51)),
+        ('exams of user', 'ix_exams_user_id_started_at',
+         select(Exam).where(Exam.user_id == 900003).order_by(Exam.started_at.desc()).limit(20)),
+        ('prediction logs of user', 'ix_ai_prediction_logs_user_id_created_at',
+         select(AIPredictionLog).where(AIPredictionLog.user_id == 900003)
+         .order_by(AIPredictionLog.created_at.desc(), AIPredictionLog.id.desc()).limit(50)),
+        ('prediction logs by label', 'ix_ai_prediction_logs_label_created_at',
+         select(AIPredictionLog).where(AIPredictionLog.predicted_label == 'STOP')
+         .order_by(AIPredictionLog.created_at.desc(), AIPredictionLog.id.desc()).limit(50)),
+    ]
+
+
+def plan_nodes(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def compile_sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={'literal_binds': True}))
+
+
+async def run(categories: int, questions: int, users: int, verbose: bool) -> List[str]:
+    failures = []
+    async with engine.connect() as conn:
+        transaction = await conn.begin()
+        try:
+            for statement in SEED.split(';'):
+                if statement.strip():
+                    await conn.execute(text(statement), {
+                        'categories': categories, 'questions': questions, 'users': users,
+                    })
+
+            for title, index_name, query in router_queries():
+                raw = await conn.scalar(text('EXPLAIN (FORMAT JSON) ' + compile_sql(query)))
+                plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+                used = {node.get('Index Name') for node in plan_nodes(plan)
+                        if node['Node Type'] in INDEX_NODES}
+                ok = index_name in used
+                print(f'{"OK  " if ok else "FAIL"} {title:35} expected {index_name}, used {sorted(used) or "-"}')
+                if verbose or not ok:
+                    print(json.dumps(plan, indent=2, default=str))
+                if not ok:
+                    failures.append(title)
+        finally:
+            await transaction.rollback()
+    await engine.dispose()
+    return failures
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categories', type=int, default=20)
+    parser.add_argument('--questions', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args(argv)
+
+    started = datetime.now()
+    failures = asyncio.run(run(args.categories, args.questions, args.users, args.verbose))
+    print(f'{len(failures)} failed, took {(datetime.now() - started).total_seconds():.1f}s')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+
+from .database import SessionLocal
+from .models import AIPredictionLog
+
+logger = logging.getLogger(__name__)
+
+
+class PredictionLogWriter:
+    """Копит записи предсказаний в памяти и пишет их в БД пачками.
+
+    Сброс происходит, когда в буфере набралось ``batch_size`` записей или
+    прошло ``flush_interval`` секунд. При остановке буфер дописывается до конца.
+
+    Если пачку не принимает сама БД (например, ``user_id`` уже удалённого
+    пользователя), она делится пополам, пока не останется одна плохая
+    запись, которая отбрасывается; остальные пишутся как обычно.
+    """
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 2.0,
+                 max_buffer: int = 50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: deque = deque(maxlen=max_buffer)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        self.written_total = 0
+        self.dropped_total = 0
+        self.rejected_total = 0
+        self.failed_flushes = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            # Без cancel: текущий сброс доходит до конца, и пачка не теряется
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+
+    def log(self, predicted_label: str, confidence: float, image_url: str,
+            user_id: Optional[int] = None):
+        if len(self._buffer) >= self.max_buffer:
+            # БД не успевает: deque с maxlen вытеснит самую старую запись
+            self.dropped_total += 1
+        self._buffer.append({
+            'predicted_label': predicted_label,
+            'confidence': confidence,
+            'image_url': image_url,
+            'user_id': user_id,
+            'created_at': datetime.utcnow(),
+        })
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._buffer:
+                if not await self.flush():
+                    break
+
+    async def flush(self) -> bool:
+        records = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        if not records:
+            return True
+
+        pending = deque([records])
+        try:
+            while pending:
+                chunk = pending[0]
+                try:
+                    await self._insert(chunk)
+                except (IntegrityError, DataError):
+                    pending.popleft()
+                    if len(chunk) == 1:
+                        logger.warning('Dropping prediction log rejected by the database: %s', chunk[0])
+                        self.rejected_total += 1
+                    else:
+                        middle = len(chunk) // 2
+                        pending.extendleft([chunk[middle:], chunk[:middle]])
+                    continue
+                pending.popleft()
+                self.written_total += len(chunk)
+        except BaseException as e:
+            # БД недоступна или задачу отменили: ненаписанное возвращается в буфер
+            for chunk in reversed(pending):
+                self._buffer.extendleft(reversed(chunk))
+            if not isinstance(e, Exception):
+                raise
+            logger.exception('Failed to write %d prediction logs', sum(map(len, pending)))
+            self.failed_flushes += 1
+            return False
+        return True
+
+    @staticmethod
+    async def _insert(records: List[dict]):
+        async with SessionLocal() as db:
+            await db.execute(insert(AIPredictionLog), records)
+            await db.commit()
+
+    def stats(self) -> dict:
+        return {
+            'buffered': len(self._buffer),
+            'written_total': self.written_total,
+            'dropped_total': self.dropped_total,
+            'rejected_total': self.rejected_total,
+            'failed_flushes': self.failed_flushes,
+        }
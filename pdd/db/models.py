@@ -3,8 +3,9 @@ from enum import Enum as PyEnum
 from typing import List, Optional
 from sqlalchemy import (
     String, Integer, Text, DateTime,
-    ForeignKey, Boolean, Float, Enum
+    ForeignKey, Boolean, Float, Enum, Index, UniqueConstraint
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import (
     Mapped, mapped_column, relationship
 )
@@ -23,6 +24,11 @@ class ExamStatus(PyEnum):
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Список пользователей: фильтр по дате регистрации и по началу email
+        Index("ix_users_created_at", "created_at"),
+        Index("ix_users_email_pattern", "email", postgresql_ops={"email": "varchar_pattern_ops"}),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     email: Mapped[str] = mapped_column(String(255), unique=True, nullable=False)
@@ -39,9 +45,11 @@ class RefreshToken(Base):
     __tablename__ = "refresh_token"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    token: Mapped[str] = mapped_column(String, unique=True, nullable=True)
+    # sha256 токена: сам токен в базе не хранится, а индекс по строке фиксированной длины
+    token_hash: Mapped[str] = mapped_column(String(64), unique=True, index=True, nullable=False)
     created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'))
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), index=True)
     user: Mapped['User'] = relationship('User', back_populates='refresh_tokens')
 
 
@@ -58,6 +66,15 @@ class Category(Base):
 
 class Question(Base):
     __tablename__ = "questions"
+    __table_args__ = (
+        # Список вопросов: фильтр по категории/сложности и keyset по id
+        Index("ix_questions_category_difficulty_id", "category_id", "difficulty", "id"),
+        Index("ix_questions_difficulty_id", "difficulty", "id"),
+        # Поиск: полнотекстовый по search_vector и нечёткий по триграммам текста
+        Index("ix_questions_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_questions_text_trgm", "text", postgresql_using="gin",
+              postgresql_ops={"text": "gin_trgm_ops"}),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     text: Mapped[str] = mapped_column(Text, nullable=False)
@@ -72,6 +89,14 @@ class Question(Base):
 
     answer_options: Mapped[List["AnswerOption"]] = relationship( back_populates="question", cascade="all, delete-orphan")
 
+    # Оптимистическая блокировка: UPDATE идёт с WHERE version = <прочитанная>
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+
+    # Заполняется триггером из text и explanation
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, deferred=True)
+
+    __mapper_args__ = {"version_id_col": version}
+
 
 
 class AnswerOption(Base):
@@ -81,13 +106,16 @@ class AnswerOption(Base):
     text: Mapped[str] = mapped_column(Text, nullable=False)
     is_correct: Mapped[bool] = mapped_column(Boolean, default=False)
 
-    question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
+    question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"), index=True)
     question: Mapped["Question"] = relationship(back_populates="answer_options")
 
 
 
 class Exam(Base):
     __tablename__ = "exams"
+    __table_args__ = (
+        Index("ix_exams_user_id_started_at", "user_id", "started_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     score: Mapped[int] = mapped_column(Integer, default=0)
@@ -98,23 +126,68 @@ class Exam(Base):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     user: Mapped["User"] = relationship(back_populates="exams")
 
+    # Параметры, по которым собран билет
+    category_id: Mapped[Optional[int]] = mapped_column(ForeignKey("categories.id"))
+    difficulty: Mapped[Optional[QuestionDifficulty]] = mapped_column(Enum(QuestionDifficulty))
+
+    # Старые экзамены на один вопрос; билеты хранятся в exam_questions
+    question_id: Mapped[Optional[int]] = mapped_column(ForeignKey("questions.id"))
+    question: Mapped[Optional["Question"]] = relationship()
+
+    questions: Mapped[List["ExamQuestion"]] = relationship(
+        back_populates="exam", cascade="all, delete-orphan", passive_deletes=True,
+        order_by="ExamQuestion.position")
+
+
+
+class ExamQuestion(Base):
+    __tablename__ = "exam_questions"
+    __table_args__ = (
+        UniqueConstraint("exam_id", "position"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, nullable=False)
+
+    exam_id: Mapped[int] = mapped_column(ForeignKey("exams.id", ondelete="CASCADE"))
+    exam: Mapped["Exam"] = relationship(back_populates="questions")
+
     question_id: Mapped[int] = mapped_column(ForeignKey("questions.id"))
     question: Mapped["Question"] = relationship()
 
+    # Заполняются при сдаче экзамена
+    selected_option_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey("answer_options.id", ondelete="SET NULL"))
+    is_correct: Mapped[Optional[bool]] = mapped_column(Boolean)
+
 
 
 class Video(Base):
     __tablename__ = "videos"
+    __table_args__ = (
+        Index("ix_videos_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_videos_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     title: Mapped[str] = mapped_column(String(255), nullable=False)
     description: Mapped[Optional[str]] = mapped_column(Text)
     url: Mapped[str] = mapped_column(String(500), nullable=False)
 
+    # Заполняется триггером из title и description
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, deferred=True)
+
 
 
 class AIPredictionLog(Base):
     __tablename__ = "ai_prediction_logs"
+    __table_args__ = (
+        # История предсказаний: новые сверху, с фильтром по пользователю или метке
+        Index("ix_ai_prediction_logs_user_id_created_at", "user_id", "created_at"),
+        Index("ix_ai_prediction_logs_label_created_at", "predicted_label", "created_at"),
+        Index("ix_ai_prediction_logs_created_at", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     image_url: Mapped[str] = mapped_column(String(500), nullable=False)
@@ -122,5 +195,6 @@ class AIPredictionLog(Base):
     confidence: Mapped[float] = mapped_column(Float, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    user: Mapped["User"] = relationship(back_populates="ai_predictions")
\ No newline at end of file
+    # Предсказывать можно и без авторизации
+    user_id: Mapped[Optional[int]] = mapped_column(ForeignKey("users.id"))
+    user: Mapped[Optional["User"]] = relationship(back_populates="ai_predictions")
\ No newline at end of file
@@ -0,0 +1,9 @@
+from redis import asyncio as aioredis
+from .config import CACHE_REDIS_URL, REDIS_URL
+
+# Соединение открывается лениво, при первой команде
+redis_client = aioredis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+
+# Кэш предсказаний: при CACHE_REDIS_URL == REDIS_URL это тот же клиент
+cache_redis_client = redis_client if CACHE_REDIS_URL == REDIS_URL else aioredis.from_url(
+    CACHE_REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
@@ -13,6 +13,11 @@ class UserSchema(BaseModel):
         from_attributes = True
 
 
+class UserListResponse(BaseModel):
+    items: List[UserSchema]
+    next_after_id: Optional[int] = None
+
+
 class UserCreateSchema(BaseModel):
     email: EmailStr
     username: str
@@ -47,6 +52,17 @@ class QuestionCreate(BaseModel):
     answer_options: List[AnswerOptionCreate]
 
 
+class AnswerOptionUpdate(AnswerOptionCreate):
+    # Без id вариант считается новым; существующие варианты без пары удаляются
+    id: Optional[int] = None
+
+
+class QuestionUpdate(QuestionCreate):
+    answer_options: List[AnswerOptionUpdate]
+    # Версия, прочитанная клиентом; если не совпадает с текущей — 409
+    version: Optional[int] = None
+
+
 class AnswerOptionOut(BaseModel):
     id: str
     text: str
@@ -67,6 +83,8 @@ class QuestionListItem(BaseModel):
 
 class QuestionListResponse(BaseModel):
     items: List[QuestionListItem]
+    next_after_id: Optional[str] = None
+    total: Optional[int] = None
 
 
 class QuestionDetailResponse(BaseModel):
@@ -74,6 +92,7 @@ class QuestionDetailResponse(BaseModel):
     text: str
     explanation: Optional[str] = None
     correct_option_id: str
+    version: int
 
 
 
@@ -84,12 +103,56 @@ class ExamSchema(BaseModel):
     status: ExamStatus
     started_at: datetime
     finished_at: Optional[datetime]
-    question_id: int
+    category_id: Optional[int] = None
+    difficulty: Optional[QuestionDifficulty] = None
+    question_id: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 
+class ExamCreate(BaseModel):
+    user_id: int
+    category_id: Optional[int] = None
+    difficulty: Optional[QuestionDifficulty] = None
+
+
+class ExamTicketResponse(ExamSchema):
+    questions: List[QuestionListItem]
+
+
+class ExamAnswer(BaseModel):
+    question_id: int
+    option_id: int
+
+
+class ExamSubmit(BaseModel):
+    answers: List[ExamAnswer]
+
+
+class ExamAnswerResult(BaseModel):
+    question_id: int
+    selected_option_id: Optional[int] = None
+    correct_option_id: Optional[int] = None
+    is_correct: bool
+
+
+class ExamCategoryScore(BaseModel):
+    category_id: int
+    correct: int
+    total: int
+
+
+class ExamResultResponse(BaseModel):
+    exam_id: int
+    status: ExamStatus
+    score: int
+    total: int
+    finished_at: datetime
+    categories: List[ExamCategoryScore]
+    answers: List[ExamAnswerResult]
+
+
 
 class VideoSchema(BaseModel):
     id: int
@@ -102,9 +165,41 @@ class VideoSchema(BaseModel):
 
 
 
+class QuestionSearchItem(BaseModel):
+    id: str
+    text: str
+    explanation: Optional[str] = None
+    category_id: int
+    difficulty: QuestionDifficulty
+    rank: float
+
+
+class VideoSearchItem(BaseModel):
+    id: int
+    title: str
+    description: Optional[str] = None
+    url: str
+    rank: float
+
+
+class QuestionSearchResponse(BaseModel):
+    items: List[QuestionSearchItem]
+    page: int
+    size: int
+    has_next: bool
+
+
+class VideoSearchResponse(BaseModel):
+    items: List[VideoSearchItem]
+    page: int
+    size: int
+    has_next: bool
+
+
+
 class AIPredictionLogSchema(BaseModel):
     id: int
-    user_id: int
+    user_id: Optional[int]
     image_url: str
     predicted_label: str
     confidence: float
@@ -0,0 +1,126 @@
+import asyncio
+from collections import Counter
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Tuple
+
+import torch
+
+
+class BatchingEngine:
+    """Собирает одиночные запросы в батч и прогоняет их через модель одним forward.
+
+    Батч отправляется, как только набралось ``max_batch_size`` тензоров или
+    истекло ``max_wait_ms`` с момента прихода первого из них. Если передан
+    ``executor``, forward выполняется в нём, а не в event loop.
+    """
+
+    def __init__(self, forward: Callable[[torch.Tensor], torch.Tensor],
+                 max_batch_size: int = 16, max_wait_ms: float = 5.0,
+                 executor: Optional[Executor] = None):
+        self.forward = forward
+        self.executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+
+        self.batch_sizes: Counter = Counter()
+        self.queue_depths: Counter = Counter()
+        self.max_queue_depth = 0
+        self.items_total = 0
+        self.batches_total = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while self._queue is not None and not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError('Inference engine stopped'))
+
+    async def submit(self, tensor: torch.Tensor) -> torch.Tensor:
+        """Ставит один тензор (C, H, W) в очередь и ждёт строку выхода модели для него."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((tensor, future))
+        depth = self._queue.qsize()
+        self.max_queue_depth = max(self.max_queue_depth, depth)
+        return await future
+
+    async def run_batch(self, batch: torch.Tensor) -> torch.Tensor:
+        """Прогоняет уже собранный батч (N, C, H, W) мимо очереди."""
+        self.batch_sizes[len(batch)] += 1
+        self.batches_total += 1
+        self.items_total += len(batch)
+        if self.executor is None:
+            return self.forward(batch)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.forward, batch)
+
+    async def _collect(self) -> List[Tuple[torch.Tensor, asyncio.Future]]:
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        self.queue_depths[self._queue.qsize() + 1] += 1
+        deadline = loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Клиент мог отключиться, пока запрос стоял в очереди
+            batch = [(tensor, future) for tensor, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            try:
+                outputs = await self.run_batch(torch.stack([tensor for tensor, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), output in zip(batch, outputs):
+                if not future.done():
+                    future.set_result(output)
+
+    def stats(self) -> dict:
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'items_total': self.items_total,
+            'batches_total': self.batches_total,
+            'avg_batch_size': round(self.items_total / self.batches_total, 2) if self.batches_total else 0,
+            'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+            'queue_depth_histogram': dict(sorted(self.queue_depths.items())),
+        }
@@ -0,0 +1,92 @@
+"""Сравнение вариантов CheckImage по задержке и памяти на CPU.
+
+    python -m pdd.ml.benchmark                      # все доступные варианты
+    python -m pdd.ml.benchmark --variant quantized  # один вариант в текущем процессе
+
+Каждый вариант меряется в отдельном процессе, чтобы RSS не смешивался.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import List
+
+import torch
+
+from .runtime import INPUT_SHAPE, VARIANTS, export_path, load_model
+
+
+def rss_mb() -> float:
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def run_variant(variant: str, batch_sizes: List[int], iterations: int, threads: int) -> dict:
+    torch.set_num_threads(threads)
+    baseline = rss_mb()
+    model = load_model(variant, torch.device('cpu'))
+    loaded = rss_mb()
+
+    latencies = {}
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            batch = torch.rand(batch_size, *INPUT_SHAPE)
+            for _ in range(3):
+                model(batch)
+            timings = []
+            for _ in range(iterations):
+                started = time.perf_counter()
+                model(batch)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            latencies[batch_size] = {
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 2),
+                'per_image_ms': round(statistics.median(timings) / batch_size, 2),
+            }
+
+    return {
+        'variant': variant,
+        'model_rss_mb': round(loaded - baseline, 1),
+        'peak_rss_mb': round(rss_mb(), 1),
+        'latency': latencies,
+    }
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variant', choices=VARIANTS)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--threads', type=int, default=torch.get_num_threads())
+    args = parser.parse_args(argv)
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.batch_sizes, args.iterations, args.threads)))
+        return 0
+
+    for variant in VARIANTS:
+        if variant != 'eager' and not os.path.exists(export_path(variant)):
+            print(f'{variant:12} skipped, not exported')
+            continue
+        output = subprocess.run(
+            [sys.executable, '-m', 'pdd.ml.benchmark', '--variant', variant,
+             '--iterations', str(args.iterations), '--threads', str(args.threads),
+             '--batch-sizes', *map(str, args.batch_sizes)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        latency = '  '.join(f'bs={size}: p50 {stats["p50_ms"]}ms ({stats["per_image_ms"]}ms/img)'
+                            for size, stats in result['latency'].items())
+        print(f'{variant:12} model RSS {result["model_rss_mb"]:7.1f}MB  {latency}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
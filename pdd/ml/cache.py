@@ -0,0 +1,150 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from redis.exceptions import RedisError
+
+from pdd.services.metrics import CACHE_REQUESTS
+
+
+class PredictionCache:
+    """Кэш результатов предсказания по sha256 загруженного файла.
+
+    Первый уровень — LRU в памяти процесса, второй — общий для всех
+    воркеров Redis. Версия модели входит в ключ, поэтому после смены
+    весов старые ответы просто перестают находиться.
+    """
+
+    def __init__(self, redis, model_version: str, ttl: int,
+                 local_size: int = 1024, local_ttl: int = 600,
+                 prefix: str = 'pdd:predict'):
+        self.redis = redis
+        self.model_version = model_version
+        self.ttl = ttl
+        self.local_size = local_size
+        self.local_ttl = local_ttl
+        self.prefix = prefix
+        self._local: OrderedDict = OrderedDict()
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    def _key(self, digest: str) -> str:
+        return f'{self.prefix}:{self.model_version}:{digest}'
+
+    def _get_local(self, key: str) -> Optional[dict]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._local[key]
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: dict):
+        self._local[key] = (time.monotonic() + self.local_ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def get(self, digest: str) -> Optional[dict]:
+        key = self._key(digest)
+        value = self._get_local(key)
+        if value is not None:
+            self.local_hits += 1
+            CACHE_REQUESTS.labels('predict', 'local_hit').inc()
+            return value
+
+        try:
+            raw = await self.redis.get(key)
+        except RedisError:
+            self.redis_errors += 1
+            raw = None
+        if raw is None:
+            self.misses += 1
+            CACHE_REQUESTS.labels('predict', 'miss').inc()
+            return None
+
+        value = json.loads(raw)
+        self._set_local(key, value)
+        self.redis_hits += 1
+        CACHE_REQUESTS.labels('predict', 'redis_hit').inc()
+        return value
+
+    async def get_many(self, digests: List[str]) -> List[Optional[dict]]:
+        """Как ``get`` для пачки: промахи локального кэша — одним MGET."""
+        results: List[Optional[dict]] = []
+        missing = []
+        for i, digest in enumerate(digests):
+            value = self._get_local(self._key(digest))
+            if value is not None:
+                self.local_hits += 1
+                CACHE_REQUESTS.labels('predict', 'local_hit').inc()
+            else:
+                missing.append(i)
+            results.append(value)
+        if not missing:
+            return results
+
+        try:
+            raws = await self.redis.mget([self._key(digests[i]) for i in missing])
+        except RedisError:
+            self.redis_errors += 1
+            raws = [None] * len(missing)
+        for i, raw in zip(missing, raws):
+            if raw is None:
+                self.misses += 1
+                CACHE_REQUESTS.labels('predict', 'miss').inc()
+                continue
+            results[i] = json.loads(raw)
+            self._set_local(self._key(digests[i]), results[i])
+            self.redis_hits += 1
+            CACHE_REQUESTS.labels('predict', 'redis_hit').inc()
+        return results
+
+    async def set_many(self, values: Dict[str, dict]):
+        if not values:
+            return
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for digest, value in values.items():
+                    key = self._key(digest)
+                    self._set_local(key, value)
+                    pipe.set(key, json.dumps(value), ex=self.ttl)
+                await pipe.execute()
+        except RedisError:
+            self.redis_errors += 1
+
+    async def set(self, digest: str, value: dict):
+        key = self._key(digest)
+        self._set_local(key, value)
+        try:
+            await self.redis.set(key, json.dumps(value), ex=self.ttl)
+        except RedisError:
+            self.redis_errors += 1
+
+    def clear_local(self):
+        self._local.clear()
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        hits = self.local_hits + self.redis_hits
+        return {
+            'model_version': self.model_version,
+            'local_size': len(self._local),
+            'local_hits': self.local_hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0,
+            'redis_errors': self.redis_errors,
+        }
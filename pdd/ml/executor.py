@@ -0,0 +1,65 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+import torch
+
+
+class InferenceOverloaded(Exception):
+    pass
+
+
+class InferenceExecutor:
+    """Пулы потоков для декодирования картинок и forward модели.
+
+    PIL и torch отпускают GIL, поэтому тяжёлая работа идёт в потоках, а
+    event loop остаётся свободным для остальных роутов. Forward выполняется
+    в одном потоке, параллелизм внутри него даёт torch (``torch_threads``).
+    """
+
+    def __init__(self, decode_workers: int = 2, max_pending: int = 64,
+                 torch_threads: int = 1):
+        torch.set_num_threads(max(1, torch_threads))
+        self.decode_pool = ThreadPoolExecutor(max_workers=max(1, decode_workers),
+                                              thread_name_prefix='pdd-decode')
+        self.model_pool = ThreadPoolExecutor(max_workers=1,
+                                             thread_name_prefix='pdd-model')
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected_total = 0
+
+    @asynccontextmanager
+    async def slot(self, images: int = 1):
+        """Занимает ``images`` мест в очереди инференса или сразу отказывает.
+
+        Очередь считается в картинках, а не в запросах: пакетный запрос
+        занимает столько мест, сколько картинок отдаёт на декодирование, так
+        что и очередь пула декодирования не растёт больше ``max_pending``.
+        Пакет крупнее всей очереди проходит, только когда она пуста.
+        """
+        images = min(images, self.max_pending)
+        if self.pending + images > self.max_pending:
+            self.rejected_total += 1
+            raise InferenceOverloaded()
+        self.pending += images
+        try:
+            yield
+        finally:
+            self.pending -= images
+
+    async def decode(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.decode_pool, partial(fn, *args))
+
+    def shutdown(self):
+        self.decode_pool.shutdown(wait=False, cancel_futures=True)
+        self.model_pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'rejected_total': self.rejected_total,
+            'torch_threads': torch.get_num_threads(),
+        }
@@ -0,0 +1,93 @@
+"""Экспорт CheckImage в оптимизированные варианты и проверка паритета с eager.
+
+    python -m pdd.ml.export --variants torchscript quantized onnx
+    python -m pdd.ml.export --check --images path/to/signs
+"""
+import argparse
+import os
+import sys
+from typing import List
+
+import torch
+import torch.nn.functional as F
+
+from pdd.db.config import MODEL_EXPORT_DIR
+from .preprocess import decode_image
+from .runtime import INPUT_SHAPE, export_path, load_eager, load_model, quantize
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def export(variant: str, eager: torch.nn.Module) -> str:
+    path = export_path(variant)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    example = torch.rand(1, *INPUT_SHAPE)
+
+    with torch.no_grad():
+        if variant == 'torchscript':
+            module = torch.jit.freeze(torch.jit.script(eager))
+            module.save(path)
+        elif variant == 'quantized':
+            module = torch.jit.trace(quantize(eager), example)
+            module.save(path)
+        elif variant == 'onnx':
+            torch.onnx.export(
+                eager, example, path,
+                input_names=['input'], output_names=['logits'],
+                dynamic_axes={'input': {0: 'batch'}, 'logits': {0: 'batch'}},
+                opset_version=17,
+            )
+        else:
+            raise ValueError(f'Variant {variant!r} cannot be exported')
+    return path
+
+
+def load_samples(images_dir: str, count: int) -> torch.Tensor:
+    if not images_dir:
+        return torch.rand(count, *INPUT_SHAPE)
+    names = sorted(name for name in os.listdir(images_dir) if name.lower().endswith(IMAGE_EXTENSIONS))
+    tensors = []
+    for name in names[:count]:
+        with open(os.path.join(images_dir, name), 'rb') as image:
+            tensors.append(decode_image(image.read()))
+    return torch.stack(tensors)
+
+
+def check_parity(variant: str, eager: torch.nn.Module, samples: torch.Tensor,
+                 min_agreement: float) -> bool:
+    candidate = load_model(variant, torch.device('cpu'))
+    with torch.no_grad():
+        expected = F.softmax(eager(samples), dim=1)
+        actual = F.softmax(candidate(samples), dim=1)
+
+    agreement = (expected.argmax(dim=1) == actual.argmax(dim=1)).float().mean().item()
+    max_diff = (expected - actual).abs().max().item()
+    ok = agreement >= min_agreement
+    print(f'{variant:12} top-1 agreement {agreement:.4f}  max prob diff {max_diff:.5f}  '
+          f'{"OK" if ok else "FAIL"}')
+    return ok
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--variants', nargs='+', default=['torchscript', 'quantized'],
+                        choices=['torchscript', 'quantized', 'onnx'])
+    parser.add_argument('--check', action='store_true', help='только проверить уже экспортированные файлы')
+    parser.add_argument('--images', help='папка с реальными знаками для проверки паритета')
+    parser.add_argument('--samples', type=int, default=256)
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    args = parser.parse_args(argv)
+
+    eager = load_eager()
+    if not args.check:
+        for variant in args.variants:
+            print(f'{variant:12} -> {export(variant, eager)}')
+
+    samples = load_samples(args.images, args.samples)
+    results = [check_parity(variant, eager, samples, args.min_agreement) for variant in args.variants]
+    print(f'Exported models are in {MODEL_EXPORT_DIR}/')
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
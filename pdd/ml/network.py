@@ -0,0 +1,36 @@
+import torch.nn as nn
+
+
+class CheckImage(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.first = nn.Sequential(
+            nn.Conv2d(3, 64, kernel_size=3, padding=1),
+            nn.BatchNorm2d(64),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(64, 128, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(128, 256, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+
+            nn.Conv2d(256, 512, kernel_size=3, padding=1),
+            nn.ReLU(),
+            nn.MaxPool2d(2),
+        )
+        self.second = nn.Sequential(
+            nn.Flatten(),
+            nn.Linear(512 * 8 * 8, 1024),
+            nn.ReLU(),
+            nn.Linear(1024, 11)
+        )
+
+    def forward(self, x):
+        x = self.first(x)
+        x = self.second(x)
+        return x
+
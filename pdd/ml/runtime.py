@@ -0,0 +1,115 @@
+import os
+import threading
+from typing import Iterable
+
+import torch
+import torch.nn as nn
+
+from pdd.db.config import MODEL_PATH, MODEL_EXPORT_DIR, MODEL_MMAP, INFERENCE_TORCH_THREADS
+from .network import CheckImage
+
+VARIANTS = ('eager', 'torchscript', 'quantized', 'onnx')
+
+EXPORT_FILES = {
+    'torchscript': 'pdd_model.ts',
+    'quantized': 'pdd_model_int8.ts',
+    'onnx': 'pdd_model.onnx',
+}
+
+INPUT_SHAPE = (3, 128, 128)
+
+
+class OnnxModel:
+    """Обёртка над onnxruntime с тем же интерфейсом, что и у torch-модели."""
+
+    def __init__(self, path: str, threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        outputs = self.session.run(None, {self.input_name: batch.cpu().numpy()})
+        return torch.from_numpy(outputs[0])
+
+    def eval(self):
+        return self
+
+
+def export_path(variant: str) -> str:
+    return os.path.join(MODEL_EXPORT_DIR, EXPORT_FILES[variant])
+
+
+def select_device(variant: str) -> torch.device:
+    # int8 и onnxruntime здесь только под CPU
+    if variant in ('eager', 'torchscript') and torch.cuda.is_available():
+        return torch.device('cuda')
+    return torch.device('cpu')
+
+
+def load_eager(device: torch.device = torch.device('cpu'), path: str = MODEL_PATH,
+               mmap: bool = MODEL_MMAP) -> nn.Module:
+    model = CheckImage()
+    # assign=True оставляет в модели mmap-тензоры вместо копии весов в свою память
+    state = torch.load(path, map_location=device, mmap=mmap)
+    model.load_state_dict(state, assign=mmap)
+    model.to(device)
+    model.eval()
+    return model
+
+
+def quantize(model: nn.Module) -> nn.Module:
+    # Динамическая int8-квантизация: основная масса весов в Linear(512*8*8, 1024)
+    return torch.ao.quantization.quantize_dynamic(model.cpu(), {nn.Linear}, dtype=torch.qint8)
+
+
+def load_model(variant: str, device: torch.device):
+    if variant not in VARIANTS:
+        raise ValueError(f'Unknown model variant {variant!r}, expected one of {VARIANTS}')
+
+    if variant == 'eager':
+        return load_eager(device)
+
+    path = export_path(variant)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'{path} not found, run `python -m pdd.ml.export --variants {variant}`')
+
+    if variant == 'onnx':
+        return OnnxModel(path, threads=INFERENCE_TORCH_THREADS)
+
+    model = torch.jit.load(path, map_location=device)
+    model.eval()
+    return model
+
+
+class LazyModel:
+    """Загружает модель при первом обращении; безопасно из нескольких потоков."""
+
+    def __init__(self, variant: str, device: torch.device):
+        self.variant = variant
+        self.device = device
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = load_model(self.variant, self.device)
+        return self._model
+
+    def __call__(self, batch: torch.Tensor) -> torch.Tensor:
+        return self.get()(batch)
+
+    def warmup(self, batch_sizes: Iterable[int] = (1,)):
+        model = self.get()
+        with torch.no_grad():
+            for batch_size in batch_sizes:
+                model(torch.zeros(batch_size, *INPUT_SHAPE, device=self.device))
@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from pdd.db.config import ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from pdd.db.redis import redis_client
+from .metrics import CACHE_REQUESTS
+
+
+class CurrentUser(NamedTuple):
+    id: int
+    username: str
+    email: Optional[str]
+
+
+class AuthCache:
+    """Проверенные access-токены в памяти процесса, по jti.
+
+    Всё, что нужно роутам о пользователе, лежит в claims токена, поэтому
+    таблица users не читается вовсе. Отзыв (logout, изменение или удаление
+    пользователя) пишется в Redis: для сессии — её id, для пользователя —
+    момент, раньше которого выданные токены недействительны. Redis
+    спрашивается только при промахе кэша, так что в других воркерах отзыв
+    вступает в силу не позже чем через ``ttl`` секунд.
+    """
+
+    def __init__(self, redis, ttl: float = 10.0, max_size: int = 10000,
+                 revoke_ttl: int = 1800, prefix: str = 'pdd:auth'):
+        self.redis = redis
+        self.ttl = ttl
+        self.max_size = max_size
+        self.revoke_ttl = revoke_ttl
+        self.prefix = prefix
+        self._tokens: 'OrderedDict[str, Tuple[float, Optional[str], CurrentUser]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, jti: str) -> Optional[CurrentUser]:
+        entry = self._tokens.get(jti)
+        if entry is None or entry[0] <= time.monotonic():
+            self.misses += 1
+            CACHE_REQUESTS.labels('auth', 'miss').inc()
+            return None
+        self._tokens.move_to_end(jti)
+        self.hits += 1
+        CACHE_REQUESTS.labels('auth', 'hit').inc()
+        return entry[2]
+
+    def put(self, jti: str, sid: Optional[str], user: CurrentUser, expires_in: float):
+        self._tokens[jti] = (time.monotonic() + min(self.ttl, expires_in), sid, user)
+        self._tokens.move_to_end(jti)
+        while len(self._tokens) > self.max_size:
+            self._tokens.popitem(last=False)
+
+    async def is_revoked(self, user_id: int, sid: Optional[str], issued_at: float) -> bool:
+        try:
+            revoked_at, session_revoked = await self.redis.mget(
+                f'{self.prefix}:user:{user_id}', f'{self.prefix}:sid:{sid}')
+        except RedisError:
+            # Без Redis пропускаем по подписи: токены и так короткие
+            return False
+        if session_revoked is not None:
+            return True
+        return revoked_at is not None and issued_at <= float(revoked_at)
+
+    async def revoke_user(self, user_id: int):
+        """Все токены пользователя, выданные до этого момента, перестают действовать."""
+        self._drop(lambda sid, user: user.id == user_id)
+        try:
+            await self.redis.set(f'{self.prefix}:user:{user_id}', time.time(), ex=self.revoke_ttl)
+        except RedisError:
+            pass
+
+    async def revoke_session(self, sid: str):
+        self._drop(lambda entry_sid, user: entry_sid == sid)
+        try:
+            await self.redis.set(f'{self.prefix}:sid:{sid}', 1, ex=self.revoke_ttl)
+        except RedisError:
+            pass
+
+    def _drop(self, predicate):
+        for jti in [jti for jti, (_, sid, user) in self._tokens.items() if predicate(sid, user)]:
+            del self._tokens[jti]
+
+    def stats(self) -> dict:
+        return {'size': len(self._tokens), 'hits': self.hits, 'misses': self.misses}
+
+
+# Отметка об отзыве нужна, пока живёт самый долгий access-токен
+auth_cache = AuthCache(redis_client, ttl=AUTH_CACHE_TTL, max_size=AUTH_CACHE_SIZE,
+                       revoke_ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 60)
@@ -0,0 +1,50 @@
+"""Ограничение размера тела запроса до разбора multipart.
+
+Starlette сначала целиком записывает multipart во временный файл и только
+потом отдаёт его роуту, так что проверка размера в самом роуте срабатывает
+слишком поздно. Middleware отказывает сразу по ``Content-Length`` или, если
+его нет, обрывает чтение тела, как только лимит превышен.
+"""
+from typing import Dict
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+class BodyTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(status_code=413, detail='Тело запроса слишком большое')
+
+
+class BodySizeLimitMiddleware:
+    """ASGI-middleware с лимитами по точному пути: ``{'/pdd/predict': 10 * 2**20}``."""
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope['path']) if scope['type'] == 'http' else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope['headers']:
+            if name == b'content-length' and value.isdigit() and int(value) > limit:
+                error = BodyTooLarge()
+                await JSONResponse({'detail': error.detail}, status_code=error.status_code)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    # HTTPException из разбора тела FastAPI пропускает как есть: ответ будет 413
+                    raise BodyTooLarge()
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,108 @@
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pdd.db.config import EXAM_POOL_TTL
+from pdd.db.models import Question, QuestionDifficulty
+from pdd.db.redis import redis_client
+
+
+class NotEnoughQuestions(Exception):
+    def __init__(self, available: int):
+        super().__init__(available)
+        self.available = available
+
+
+class QuestionPool:
+    """Пулы id вопросов по (категория, сложность) для сборки билетов.
+
+    Билет выбирается ``random.sample`` из списка id в памяти процесса, без
+    ``ORDER BY random()`` по всей таблице. Списки общие для воркеров через
+    Redis; номер версии в Redis позволяет сбросить их во всех воркерах сразу.
+    """
+
+    def __init__(self, redis, ttl: int = 600, prefix: str = 'pdd:exam_pool'):
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+        self._local: Dict[str, Tuple[float, List[int]]] = {}
+        self._version = '0'
+
+    @staticmethod
+    def _pool_name(category_id: Optional[int], difficulty: Optional[QuestionDifficulty]) -> str:
+        category = category_id if category_id is not None else 'any'
+        level = difficulty.value if difficulty is not None else 'any'
+        return f'{category}:{level}'
+
+    async def _current_version(self) -> str:
+        try:
+            version = await self.redis.get(f'{self.prefix}:version')
+        except RedisError:
+            return self._version
+        self._version = version.decode() if version else '0'
+        return self._version
+
+    async def _load_from_db(self, db: AsyncSession, category_id: Optional[int],
+                            difficulty: Optional[QuestionDifficulty]) -> List[int]:
+        query = select(Question.id)
+        if category_id is not None:
+            query = query.where(Question.category_id == category_id)
+        if difficulty is not None:
+            query = query.where(Question.difficulty == difficulty)
+        return list((await db.scalars(query)).all())
+
+    async def ids(self, db: AsyncSession, category_id: Optional[int] = None,
+                  difficulty: Optional[QuestionDifficulty] = None) -> List[int]:
+        version = await self._current_version()
+        key = f'{self.prefix}:{version}:{self._pool_name(category_id, difficulty)}'
+
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        ids = None
+        try:
+            members = await self.redis.smembers(key)
+            if members:
+                ids = [int(member) for member in members]
+        except RedisError:
+            pass
+
+        if ids is None:
+            ids = await self._load_from_db(db, category_id, difficulty)
+            if ids:
+                try:
+                    async with self.redis.pipeline(transaction=True) as pipe:
+                        pipe.sadd(key, *ids)
+                        pipe.expire(key, self.ttl)
+                        await pipe.execute()
+                except RedisError:
+                    pass
+
+        # Старые версии и просроченные пулы больше не нужны
+        self._local = {name: value for name, value in self._local.items()
+                       if value[0] > time.monotonic() and name.startswith(f'{self.prefix}:{version}:')}
+        self._local[key] = (time.monotonic() + self.ttl, ids)
+        return ids
+
+    async def sample(self, db: AsyncSession, size: int, category_id: Optional[int] = None,
+                     difficulty: Optional[QuestionDifficulty] = None) -> List[int]:
+        ids = await self.ids(db, category_id, difficulty)
+        if len(ids) < size:
+            raise NotEnoughQuestions(len(ids))
+        return random.sample(ids, size)
+
+    async def invalidate(self):
+        """Вызывается при любом изменении набора вопросов."""
+        self._local.clear()
+        try:
+            await self.redis.incr(f'{self.prefix}:version')
+        except RedisError:
+            pass
+
+
+question_pool = QuestionPool(redis_client, ttl=EXAM_POOL_TTL)
@@ -0,0 +1,88 @@
+import hashlib
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, Response
+from redis.exceptions import RedisError
+
+from pdd.db.config import HTTP_CACHE_MAX_AGE, HTTP_CACHE_VERSION_TTL
+from pdd.db.redis import redis_client
+from .metrics import CACHE_REQUESTS
+
+
+class DataVersions:
+    """Номера версий данных (categories, videos, questions) в Redis.
+
+    Версия увеличивается при каждом изменении данных; по ней считаются
+    ETag, так что проверка If-None-Match не требует запроса к БД. Значение
+    держится в памяти процесса не дольше ``local_ttl`` секунд.
+    """
+
+    def __init__(self, redis, local_ttl: float = 1.0, prefix: str = 'pdd:data_version'):
+        self.redis = redis
+        self.local_ttl = local_ttl
+        self.prefix = prefix
+        self._local: Dict[str, Tuple[float, str]] = {}
+
+    async def get(self, name: str) -> Optional[str]:
+        entry = self._local.get(name)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        try:
+            version = await self.redis.get(f'{self.prefix}:{name}')
+        except RedisError:
+            # Без общей версии воркеры могут разойтись, поэтому не кэшируем вовсе
+            return None
+        version = version.decode() if version else '0'
+        self._local[name] = (time.monotonic() + self.local_ttl, version)
+        return version
+
+    async def bump(self, *names: str):
+        for name in names:
+            self._local.pop(name, None)
+            try:
+                await self.redis.incr(f'{self.prefix}:{name}')
+            except RedisError:
+                pass
+
+
+data_versions = DataVersions(redis_client, local_ttl=HTTP_CACHE_VERSION_TTL)
+
+
+def make_etag(resource: str, version: str, request: Request) -> str:
+    raw = f'{resource}:{version}:{request.url.path}?{request.url.query}'
+    return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or etag in candidates or f'W/{etag}' in candidates
+
+
+def http_cache(resource: str, max_age: int = HTTP_CACHE_MAX_AGE,
+               version: Optional[Callable[[], Awaitable[Optional[str]]]] = None):
+    """Зависимость для GET-роутов каталога: ETag по версии данных и 304 без похода в БД.
+
+    ``version`` — источник версии для роутов, которые отдают данные не из БД,
+    а из своего кэша: ETag должен описывать именно то тело, что уйдёт в
+    ответ. По умолчанию версия берётся из ``data_versions``.
+    """
+
+    async def check(request: Request, response: Response):
+        current = await (version() if version is not None else data_versions.get(resource))
+        if current is None:
+            response.headers['Cache-Control'] = 'no-cache'
+            return
+        headers = {
+            'ETag': make_etag(resource, current, request),
+            'Cache-Control': f'public, max-age={max_age}',
+        }
+        if etag_matches(headers['ETag'], request.headers.get('if-none-match')):
+            CACHE_REQUESTS.labels('http_etag', 'not_modified').inc()
+            raise HTTPException(status_code=304, headers=headers)
+        CACHE_REQUESTS.labels('http_etag', 'full').inc()
+        response.headers.update(headers)
+
+    return Depends(check)
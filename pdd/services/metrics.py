@@ -0,0 +1,143 @@
+"""Метрики Prometheus.
+
+С одним процессом метрики живут в памяти. Под gunicorn с несколькими
+воркерами каждый воркер пишет свои значения в файлы в
+``PROMETHEUS_MULTIPROC_DIR``, а ``/metrics`` складывает их вместе. Каталог
+очищается при старте мастера хуками gunicorn.conf.py, поэтому с этой
+переменной приложение запускается только через ``gunicorn -c gunicorn.conf.py``
+(так делают и Dockerfile, и docker-compose.yml).
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess)
+from sqlalchemy import event
+
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+LATENCY_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+STAGE_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HTTP_REQUESTS = Counter(
+    'pdd_http_requests_total', 'HTTP-запросы', ['method', 'route', 'status'])
+HTTP_LATENCY = Histogram(
+    'pdd_http_request_duration_seconds', 'Время обработки запроса', ['method', 'route'],
+    buckets=LATENCY_BUCKETS)
+HTTP_IN_FLIGHT = Gauge(
+    'pdd_http_requests_in_flight', 'Запросы в обработке', ['group'], multiprocess_mode='livesum')
+
+DB_QUERIES = Histogram(
+    'pdd_db_queries_per_request', 'Запросов к БД за HTTP-запрос', ['route'], buckets=QUERY_COUNT_BUCKETS)
+DB_TIME = Histogram(
+    'pdd_db_time_per_request_seconds', 'Суммарное время запросов к БД за HTTP-запрос', ['route'],
+    buckets=LATENCY_BUCKETS)
+DB_QUERY_LATENCY = Histogram(
+    'pdd_db_query_duration_seconds', 'Время одного запроса к БД', buckets=STAGE_BUCKETS)
+
+INFERENCE_STAGE = Histogram(
+    'pdd_inference_stage_seconds', 'Этапы инференса: decode, transform, forward (на батч)', ['stage'],
+    buckets=STAGE_BUCKETS)
+CACHE_REQUESTS = Counter(
+    'pdd_cache_requests_total', 'Обращения к кэшам', ['cache', 'result'])
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_time')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+# Счётчики текущего HTTP-запроса; события SQLAlchemy выполняются в том же контексте
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar('pdd_request_stats', default=None)
+
+
+def instrument_engine(engine):
+    """Подписывается на события движка: время каждого запроса и сумма по HTTP-запросу."""
+
+    @event.listens_for(engine.sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('pdd_query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine.sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['pdd_query_started'].pop()
+        DB_QUERY_LATENCY.observe(elapsed)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(engine.sync_engine, 'handle_error')
+    def handle_error(context):
+        started = context.connection.info.get('pdd_query_started') if context.connection else None
+        if started:
+            started.pop()
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность, статус и число запросов к БД по шаблону роута.
+
+    Шаблон (``/questions/{question_id}``) берётся из ``scope['route']`` после
+    маршрутизации, так что число меток ограничено числом роутов.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._groups = None
+
+    def _group(self, scope) -> str:
+        # Для in-flight маршрут ещё не известен: берём первый сегмент пути
+        if self._groups is None:
+            self._groups = {getattr(route, 'path', '/').split('/')[1]
+                            for route in scope['app'].routes}
+        segment = scope['path'].split('/')[1]
+        return segment if segment in self._groups else 'other'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        status = 500
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        in_flight = HTTP_IN_FLIGHT.labels(self._group(scope))
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            in_flight.dec()
+            request_stats.reset(token)
+            route = scope.get('route')
+            template = route.path if route is not None else 'unmatched'
+            HTTP_REQUESTS.labels(method, template, str(status)).inc()
+            HTTP_LATENCY.labels(method, template).observe(elapsed)
+            DB_QUERIES.labels(template).observe(stats.queries)
+            DB_TIME.labels(template).observe(stats.db_time)
+
+
+def render() -> bytes:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
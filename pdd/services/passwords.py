@@ -0,0 +1,91 @@
+import asyncio
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from pdd.db.config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+
+
+class PasswordHasherOverloaded(Exception):
+    pass
+
+
+class PasswordHasher:
+    """bcrypt в отдельном пуле потоков.
+
+    Один хеш стоит 100-300 мс CPU; bcrypt отпускает GIL, поэтому в потоках он
+    не блокирует event loop. Очередь ограничена ``max_pending``: при всплеске
+    входов лишние запросы сразу получают отказ, а не копятся в памяти.
+
+    Новые хеши — ``bcrypt_sha256`` из passlib: пароль сжимается HMAC-SHA256 и
+    кодируется base64, так что ни 72-байтного предела, ни нулевых байтов.
+    Старые хеши (bcrypt от сырого sha256-дайджеста) и хеши с другой
+    стоимостью, чем ``rounds``, пересчитываются при следующем успешном входе.
+    """
+
+    def __init__(self, rounds: int = 12, workers: int = 2, max_pending: int = 32):
+        self.context = CryptContext(
+            schemes=['bcrypt_sha256', 'bcrypt'], deprecated=['bcrypt'],
+            bcrypt_sha256__default_rounds=rounds, bcrypt_sha256__min_rounds=rounds,
+            bcrypt_sha256__max_rounds=rounds,
+        )
+        self.pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='pdd-bcrypt')
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected_total = 0
+        self.rehashed_total = 0
+        # Для несуществующих пользователей: проверка занимает столько же времени
+        self._dummy_hash: Optional[str] = None
+
+    def _verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        if self.context.identify(hashed) != 'bcrypt':
+            return self.context.verify_and_update(password, hashed)
+        # Старый формат: bcrypt от сырого sha256. Дайджест с нулевым байтом passlib
+        # не принимает, значит, и хеша от такого пароля быть не может
+        digest = hashlib.sha256(password.encode('utf-8')).digest()
+        if b'\x00' in digest or not self.context.verify(digest, hashed):
+            return False, None
+        return True, self.context.hash(password)
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected_total += 1
+            raise PasswordHasherOverloaded()
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.pool, partial(fn, *args))
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        return await self._run(self.context.hash, password)
+
+    async def verify_and_update(self, password: str, hashed: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Проверяет пароль; вторым элементом — новый хеш, если старый пора заменить."""
+        if hashed is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = await self.hash('dummy')
+            await self._run(self.context.verify, password, self._dummy_hash)
+            return False, None
+        valid, new_hash = await self._run(self._verify_and_update, password, hashed)
+        if valid and new_hash:
+            self.rehashed_total += 1
+        return valid, new_hash
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'rejected_total': self.rejected_total,
+            'rehashed_total': self.rehashed_total,
+        }
+
+
+password_hasher = PasswordHasher(BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
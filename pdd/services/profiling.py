@@ -0,0 +1,200 @@
+"""Профилирование отдельных запросов.
+
+Запрос профилируется, если в нём есть заголовок ``X-Profile`` с верной
+подписью или он попал в случайную долю ``PROFILING_SAMPLE_RATE``. Короткая
+сводка уходит в заголовке ``X-Profile-Summary``, полный профиль сохраняется
+в ``PROFILING_DIR``: ``.prof`` для cProfile (``python -m pstats``,
+snakeviz) или ``.speedscope.json`` для pyinstrument (speedscope.app).
+
+Подпись действует пять минут и привязана к пути:
+
+    python -m pdd.services.profiling sign /questions
+    curl -H "X-Profile: <подпись>" http://localhost:8000/questions
+
+cProfile видит весь поток, поэтому в профиль попадают и другие запросы,
+которые event loop обслуживал в это время; pyinstrument в async-режиме
+следит только за своим запросом. Одновременно профилируется один запрос.
+"""
+import argparse
+import asyncio
+import cProfile
+import hashlib
+import hmac
+import io
+import logging
+import os
+import pstats
+import random
+import sys
+import time
+import uuid
+from typing import List, Optional
+
+from pdd.db.config import (
+    PROFILING_SECRET, PROFILING_SAMPLE_RATE, PROFILING_ENGINE, PROFILING_DIR, PROFILING_MAX_FILES)
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_TTL = 300
+SUMMARY_TOP = 3
+
+
+def sign(secret: str, path: str, timestamp: Optional[int] = None) -> str:
+    timestamp = int(time.time()) if timestamp is None else timestamp
+    digest = hmac.new(secret.encode(), f'{timestamp}:{path}'.encode(), hashlib.sha256).hexdigest()
+    return f'{timestamp}.{digest}'
+
+
+def verify_signature(secret: str, path: str, value: str) -> bool:
+    try:
+        timestamp, _ = value.split('.', 1)
+        timestamp = int(timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > SIGNATURE_TTL:
+        return False
+    return hmac.compare_digest(sign(secret, path, timestamp), value)
+
+
+class CProfileSession:
+    extension = 'prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def summary(self) -> str:
+        stats = pstats.Stats(self.profiler, stream=io.StringIO())
+        top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:SUMMARY_TOP]
+        return ', '.join(f'{os.path.basename(file)}:{line}:{name}={tottime * 1000:.1f}ms'
+                         for (file, line, name), (_, _, tottime, _, _) in top)
+
+    def save(self, path: str):
+        self.profiler.dump_stats(path)
+
+
+class PyinstrumentSession:
+    extension = 'speedscope.json'
+
+    def __init__(self):
+        from pyinstrument import Profiler
+        self.profiler = Profiler(async_mode='enabled')
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.profiler.stop()
+
+    def summary(self) -> str:
+        session = self.profiler.last_session
+        return f'samples={session.sample_count}, cpu={session.cpu_time * 1000:.1f}ms'
+
+    def save(self, path: str):
+        from pyinstrument.renderers import SpeedscopeRenderer
+        with open(path, 'w') as f:
+            f.write(self.profiler.output(renderer=SpeedscopeRenderer()))
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware, включается только при PROFILING_ENABLED.
+
+    Для непрофилируемых запросов это одна проверка заголовка и один
+    ``random()``. Профиль снимается до отправки заголовков ответа, так что
+    у потоковых ответов тело в него не попадает.
+    """
+
+    def __init__(self, app, secret: str = PROFILING_SECRET, sample_rate: float = PROFILING_SAMPLE_RATE,
+                 engine: str = PROFILING_ENGINE, directory: str = PROFILING_DIR,
+                 max_files: int = PROFILING_MAX_FILES):
+        self.app = app
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.session_class = PyinstrumentSession if engine == 'pyinstrument' else CProfileSession
+        self.directory = directory
+        self.max_files = max_files
+        self._active = False
+
+    def _triggered(self, scope) -> bool:
+        if self.secret:
+            for name, value in scope['headers']:
+                if name == b'x-profile':
+                    return verify_signature(self.secret, scope['path'], value.decode('latin-1'))
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or self._active or not self._triggered(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            session = self.session_class()
+        except ImportError:
+            logger.warning('pyinstrument is not installed, falling back to cProfile')
+            self.session_class = CProfileSession
+            session = self.session_class()
+
+        profile_id = f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:8]}'
+        stopped = False
+        started = time.perf_counter()
+
+        def stop():
+            nonlocal stopped
+            if not stopped:
+                session.stop()
+                stopped = True
+                self._active = False
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and not stopped:
+                stop()
+                elapsed = (time.perf_counter() - started) * 1000
+                summary = f'total={elapsed:.1f}ms; {session.summary()}'
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'x-profile-id', profile_id.encode()),
+                    (b'x-profile-summary', summary.encode('ascii', 'replace')),
+                ]
+            await send(message)
+
+        self._active = True
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stop()
+            path = os.path.join(self.directory, f'{profile_id}.{session.extension}')
+            loop = asyncio.get_running_loop()
+            loop.run_in_executor(None, self._save, session, path)
+
+    def _save(self, session, path: str):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            session.save(path)
+            # Храним только последние max_files профилей
+            files = sorted(os.listdir(self.directory))
+            for name in files[:max(0, len(files) - self.max_files)]:
+                os.remove(os.path.join(self.directory, name))
+        except OSError:
+            logger.exception('Failed to save profile %s', path)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    sign_parser = subparsers.add_parser('sign', help='значение заголовка X-Profile для пути')
+    sign_parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    if not PROFILING_SECRET:
+        parser.error('PROFILING_SECRET не задан')
+    print(sign(PROFILING_SECRET, args.path))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,184 @@
+import asyncio
+import bisect
+import time
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from pdd.db.config import QUESTION_BANK_CHECK_INTERVAL
+from pdd.db.database import SessionLocal
+from pdd.db.models import AnswerOption, Category, Question, QuestionDifficulty
+from pdd.db.redis import redis_client
+from .exam_pool import question_pool
+from .http_cache import data_versions
+from .metrics import CACHE_REQUESTS
+
+
+class QuestionRecord(NamedTuple):
+    id: int
+    text: str
+    explanation: Optional[str]
+    difficulty: QuestionDifficulty
+    category_id: int
+    options: Tuple[Tuple[int, str], ...]
+    correct_option_id: Optional[int]
+    version: int
+
+
+class QuestionBank:
+    """Копия банка вопросов в памяти процесса.
+
+    Вопросы меняются редко, а читаются на каждой странице теста, поэтому
+    роуты чтения обслуживаются отсюда без обращения к Postgres. Актуальность
+    проверяется по ключу версии в Redis не чаще раза в ``check_interval``
+    секунд; любое изменение вопросов увеличивает версию, и все воркеры
+    перечитывают банк.
+    """
+
+    def __init__(self, redis, check_interval: float = 1.0, key: str = 'pdd:question_bank:version'):
+        self.redis = redis
+        self.check_interval = check_interval
+        self.key = key
+        self.version: Optional[str] = None
+        self._synced = False
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+        self._questions: Dict[int, QuestionRecord] = {}
+        self._categories: Dict[str, int] = {}
+        self._indexes: Dict[Tuple[Optional[int], Optional[QuestionDifficulty]], List[int]] = {}
+
+        self.hits = 0
+        self.reloads = 0
+
+    async def _remote_version(self) -> str:
+        try:
+            version = await self.redis.get(self.key)
+        except RedisError:
+            # Без Redis живём на локальной версии; сброс придёт через invalidate()
+            self._synced = False
+            return self.version or 'local'
+        self._synced = True
+        return version.decode() if version else '0'
+
+    async def ensure_fresh(self):
+        now = time.monotonic()
+        if self.version is not None and now - self._checked_at < self.check_interval:
+            return
+        remote = await self._remote_version()
+        self._checked_at = now
+        if remote == self.version:
+            return
+        async with self._lock:
+            if remote != self.version:
+                await self._load()
+                self.version = remote
+
+    async def etag_version(self) -> Optional[str]:
+        """Версия для ETag — ровно того банка, из которого будет собран ответ.
+
+        Без Redis версия у воркеров своя, и ETag не отдаётся вовсе.
+        """
+        await self.ensure_fresh()
+        return self.version if self._synced else None
+
+    async def _load(self):
+        async with SessionLocal() as db:
+            questions = (await db.execute(select(
+                Question.id, Question.text, Question.explanation,
+                Question.difficulty, Question.category_id, Question.version,
+            ))).all()
+            options = (await db.execute(
+                select(AnswerOption.id, AnswerOption.question_id, AnswerOption.text, AnswerOption.is_correct)
+                .order_by(AnswerOption.id)
+            )).all()
+            categories = (await db.execute(select(Category.id, Category.category_name))).all()
+
+        options_by_question: Dict[int, List[Tuple[int, str]]] = {}
+        correct: Dict[int, int] = {}
+        for option in options:
+            options_by_question.setdefault(option.question_id, []).append((option.id, option.text))
+            if option.is_correct and option.question_id not in correct:
+                correct[option.question_id] = option.id
+
+        self._questions = {
+            q.id: QuestionRecord(q.id, q.text, q.explanation, q.difficulty, q.category_id,
+                                 tuple(options_by_question.get(q.id, ())), correct.get(q.id), q.version)
+            for q in questions
+        }
+        self._categories = {c.category_name: c.id for c in categories}
+        self._indexes = {(None, None): sorted(self._questions)}
+        self.reloads += 1
+        CACHE_REQUESTS.labels('question_bank', 'reload').inc()
+
+    def _ids(self, category_id: Optional[int], difficulty: Optional[QuestionDifficulty]) -> List[int]:
+        key = (category_id, difficulty)
+        if key not in self._indexes:
+            self._indexes[key] = [
+                question_id for question_id in self._indexes[(None, None)]
+                if (category_id is None or self._questions[question_id].category_id == category_id)
+                and (difficulty is None or self._questions[question_id].difficulty == difficulty)
+            ]
+        return self._indexes[key]
+
+    async def get(self, question_id: int) -> Optional[QuestionRecord]:
+        await self.ensure_fresh()
+        self.hits += 1
+        CACHE_REQUESTS.labels('question_bank', 'hit').inc()
+        return self._questions.get(question_id)
+
+    async def answer_keys(self, question_ids: List[int]) -> Dict[int, Tuple[Optional[int], FrozenSet[int]]]:
+        """Правильный вариант и все варианты каждого вопроса."""
+        await self.ensure_fresh()
+        self.hits += 1
+        CACHE_REQUESTS.labels('question_bank', 'hit').inc()
+        keys = {}
+        for question_id in question_ids:
+            record = self._questions.get(question_id)
+            if record is not None:
+                keys[question_id] = (record.correct_option_id,
+                                     frozenset(option_id for option_id, _ in record.options))
+        return keys
+
+    async def page(self, category: Optional[str], difficulty: Optional[QuestionDifficulty],
+                   after_id: Optional[int], size: int) -> Tuple[List[QuestionRecord], bool, int]:
+        await self.ensure_fresh()
+        self.hits += 1
+        CACHE_REQUESTS.labels('question_bank', 'hit').inc()
+        if category is not None:
+            category_id = self._categories.get(category)
+            if category_id is None:
+                return [], False, 0
+        else:
+            category_id = None
+
+        ids = self._ids(category_id, difficulty)
+        start = bisect.bisect_right(ids, after_id) if after_id is not None else 0
+        chunk = ids[start:start + size + 1]
+        return [self._questions[i] for i in chunk[:size]], len(chunk) > size, len(ids)
+
+    async def invalidate(self):
+        self.version = None
+        try:
+            await self.redis.incr(self.key)
+        except RedisError:
+            pass
+
+    def stats(self) -> dict:
+        return {
+            'version': self.version,
+            'questions': len(self._questions),
+            'hits': self.hits,
+            'reloads': self.reloads,
+        }
+
+
+question_bank = QuestionBank(redis_client, check_interval=QUESTION_BANK_CHECK_INTERVAL)
+
+
+async def questions_changed():
+    """Сбрасывает всё, что построено по вопросам: банк, пулы билетов и ETag."""
+    await question_bank.invalidate()
+    await question_pool.invalidate()
+    await data_versions.bump('questions')
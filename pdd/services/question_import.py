@@ -0,0 +1,275 @@
+"""Массовый импорт и экспорт банка вопросов.
+
+Строки читаются потоком и обрабатываются пачками: пачка валидируется
+схемой ``QuestionCreate`` и записывается одной транзакцией — один
+``INSERT ... RETURNING`` для вопросов и один многострочный INSERT для
+вариантов ответов. Экспорт идёт серверным курсором и не держит банк в памяти.
+
+Форматы: JSONL (одна ``QuestionCreate`` на строку) и CSV с колонками
+``text, difficulty, category_id, explanation, correct, option_1 ... option_N``,
+где ``correct`` — номер правильного варианта (с единицы).
+
+    python -m pdd.services.question_import import bank.jsonl
+    python -m pdd.services.question_import export bank.csv
+"""
+import argparse
+import asyncio
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from itertools import islice
+from typing import AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pdd.db.config import QUESTION_IMPORT_CHUNK_SIZE
+from pdd.db.database import SessionLocal, engine
+from pdd.db.models import AnswerOption, Category, Question
+from pdd.db.schema import QuestionCreate
+from .question_bank import questions_changed
+
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = ['text', 'difficulty', 'category_id', 'explanation', 'correct']
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def detect_format(filename: Optional[str]) -> Optional[str]:
+    if not filename:
+        return None
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    return None
+
+
+def _jsonl_rows(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, ImportFormatError(f'Некорректный JSON: {e.msg}')
+
+
+def _csv_rows(lines: Iterable[str]) -> Iterator[Tuple[int, object]]:
+    reader = csv.DictReader(lines)
+    missing = set(CSV_FIELDS) - set(reader.fieldnames or ())
+    if missing:
+        raise ImportFormatError(f'В CSV нет колонок: {", ".join(sorted(missing))}')
+    option_fields = [name for name in reader.fieldnames if name.startswith('option_')]
+
+    for row in reader:
+        options = [row[name] for name in option_fields if row.get(name)]
+        try:
+            correct = int(row['correct'])
+        except (TypeError, ValueError):
+            yield reader.line_num, ImportFormatError('Колонка correct должна быть номером варианта')
+            continue
+        yield reader.line_num, {
+            'text': row['text'],
+            'difficulty': (row['difficulty'] or '').lower(),
+            'category_id': row['category_id'],
+            'explanation': row['explanation'] or None,
+            'answer_options': [{'text': text, 'is_correct': position == correct}
+                               for position, text in enumerate(options, start=1)],
+        }
+
+
+def read_rows(lines: Iterable[str], fmt: str) -> Iterator[Tuple[int, object]]:
+    """Номер строки и сырой словарь (или ошибка разбора) для каждой записи."""
+    if fmt == 'jsonl':
+        return _jsonl_rows(lines)
+    if fmt == 'csv':
+        return _csv_rows(lines)
+    raise ImportFormatError(f'Неизвестный формат {fmt}. Доступно: {", ".join(FORMATS)}')
+
+
+async def insert_questions(db: AsyncSession, items: List[QuestionCreate]) -> List[int]:
+    """Вставляет вопросы с вариантами двумя запросами, без commit."""
+    question_ids = list((await db.scalars(
+        insert(Question).returning(Question.id, sort_by_parameter_order=True),
+        [{'text': item.text, 'difficulty': item.difficulty,
+          'explanation': item.explanation, 'category_id': item.category_id} for item in items],
+    )).all())
+
+    options = [
+        {'question_id': question_id, 'text': option.text, 'is_correct': option.is_correct}
+        for question_id, item in zip(question_ids, items)
+        for option in item.answer_options
+    ]
+    if options:
+        await db.execute(insert(AnswerOption), options)
+    return question_ids
+
+
+async def import_questions(db: AsyncSession, rows: Iterable[Tuple[int, object]],
+                           chunk_size: int = QUESTION_IMPORT_CHUNK_SIZE) -> dict:
+    """Импорт пачками: каждая пачка — отдельная транзакция.
+
+    Невалидные строки пропускаются и попадают в отчёт; ошибка базы
+    откатывает только свою пачку.
+    """
+    imported, failed, errors = 0, 0, []
+
+    def reject(line: int, error: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'line': line, 'error': error})
+
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        valid: List[Tuple[int, QuestionCreate]] = []
+        for line, raw in chunk:
+            if isinstance(raw, Exception):
+                reject(line, str(raw))
+                continue
+            try:
+                valid.append((line, QuestionCreate.model_validate(raw)))
+            except ValidationError as e:
+                reject(line, '; '.join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+
+        # Категории всей пачки проверяются одним запросом
+        category_ids = {item.category_id for _, item in valid}
+        known = set((await db.scalars(select(Category.id).where(Category.id.in_(category_ids)))).all()) \
+            if category_ids else set()
+        items = []
+        for line, item in valid:
+            if item.category_id in known:
+                items.append((line, item))
+            else:
+                reject(line, f'Категория {item.category_id} не найдена')
+
+        if not items:
+            await db.rollback()
+            continue
+        try:
+            await insert_questions(db, [item for _, item in items])
+            await db.commit()
+            imported += len(items)
+        except SQLAlchemyError as e:
+            await db.rollback()
+            for line, _ in items:
+                reject(line, f'Ошибка базы данных: {e.__class__.__name__}')
+
+    return {'imported': imported, 'failed': failed, 'errors': errors}
+
+
+async def export_questions(fmt: str, batch_rows: int = 1000) -> AsyncIterator[str]:
+    """Банк вопросов в JSONL или CSV, кусками по ``batch_rows`` вопросов.
+
+    Открывает свою сессию: генератор живёт дольше зависимости ``get_db``.
+    """
+    if fmt not in FORMATS:
+        raise ImportFormatError(f'Неизвестный формат {fmt}. Доступно: {", ".join(FORMATS)}')
+
+    async with SessionLocal() as db:
+        buffer = io.StringIO()
+        writer = None
+        if fmt == 'csv':
+            per_question = select(func.count(AnswerOption.id).label('n')) \
+                .group_by(AnswerOption.question_id).subquery()
+            max_options = await db.scalar(select(func.max(per_question.c.n))) or 0
+            writer = csv.writer(buffer)
+            writer.writerow(CSV_FIELDS + [f'option_{i}' for i in range(1, max_options + 1)])
+
+        def write(question: dict):
+            if writer is None:
+                buffer.write(json.dumps(question, ensure_ascii=False) + '\n')
+                return
+            options = question['answer_options']
+            correct = next((i for i, option in enumerate(options, start=1) if option['is_correct']), '')
+            writer.writerow([question['text'], question['difficulty'], question['category_id'],
+                             question['explanation'] or '', correct] + [option['text'] for option in options])
+
+        result = await db.stream(
+            select(Question.id, Question.text, Question.difficulty, Question.category_id,
+                   Question.explanation, AnswerOption.text.label('option_text'), AnswerOption.is_correct)
+            .outerjoin(AnswerOption, AnswerOption.question_id == Question.id)
+            .order_by(Question.id, AnswerOption.id)
+            .execution_options(yield_per=batch_rows * 4)
+        )
+
+        current, current_id, written = None, None, 0
+        async for row in result:
+            if row.id != current_id:
+                if current is not None:
+                    write(current)
+                    written += 1
+                    if written % batch_rows == 0:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+                current_id = row.id
+                current = {'text': row.text, 'difficulty': row.difficulty.value,
+                           'category_id': row.category_id, 'explanation': row.explanation,
+                           'answer_options': []}
+            if row.option_text is not None:
+                current['answer_options'].append({'text': row.option_text, 'is_correct': row.is_correct})
+        if current is not None:
+            write(current)
+        if buffer.tell():
+            yield buffer.getvalue()
+
+
+async def run_import(path: str, fmt: str, chunk_size: int) -> dict:
+    with open(path, encoding='utf-8-sig', newline='') as source:
+        async with SessionLocal() as db:
+            report = await import_questions(db, read_rows(source, fmt), chunk_size)
+    if report['imported']:
+        await questions_changed()
+    await engine.dispose()
+    return report
+
+
+async def run_export(path: str, fmt: str):
+    with open(path, 'w', encoding='utf-8', newline='') as target:
+        async for piece in export_questions(fmt):
+            target.write(piece)
+    await engine.dispose()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=FORMATS, help='по умолчанию — по расширению файла')
+    parser.add_argument('--chunk-size', type=int, default=QUESTION_IMPORT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or detect_format(args.path)
+    if fmt is None:
+        parser.error('не удалось определить формат, укажите --format')
+
+    started = datetime.now()
+    if args.command == 'export':
+        asyncio.run(run_export(args.path, fmt))
+        print(f'exported to {args.path}, took {(datetime.now() - started).total_seconds():.1f}s')
+        return 0
+
+    report = asyncio.run(run_import(args.path, fmt, args.chunk_size))
+    for error in report['errors']:
+        print(f"line {error['line']}: {error['error']}")
+    print(f"{report['imported']} imported, {report['failed']} failed, "
+          f"took {(datetime.now() - started).total_seconds():.1f}s")
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+import time
+from typing import Dict, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from pdd.db.config import LOGIN_RATE_LIMIT_WINDOW
+from pdd.db.redis import redis_client
+
+
+class RateLimiter:
+    """Счётчик попыток в фиксированном окне.
+
+    Счётчики общие для воркеров через Redis (INCR + EXPIRE); если Redis
+    недоступен, считаем в памяти процесса — лимит становится на воркер,
+    но не отключается совсем.
+    """
+
+    def __init__(self, redis, prefix: str, window: int):
+        self.redis = redis
+        self.prefix = prefix
+        self.window = window
+        self._local: Dict[str, Tuple[float, int]] = {}
+
+    def _hit_local(self, key: str) -> Tuple[int, int]:
+        now = time.monotonic()
+        expires_at, count = self._local.get(key, (now + self.window, 0))
+        if expires_at <= now:
+            expires_at, count = now + self.window, 0
+        self._local[key] = (expires_at, count + 1)
+        if len(self._local) > 10000:
+            self._local = {k: v for k, v in self._local.items() if v[0] > now}
+        return count + 1, int(expires_at - now) + 1
+
+    async def hit(self, name: str) -> Tuple[int, int]:
+        """Засчитывает попытку; возвращает число попыток в окне и секунды до его конца."""
+        key = f'{self.prefix}:{name}'
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, self.window, nx=True)
+                pipe.ttl(key)
+                count, _, ttl = await pipe.execute()
+            return count, max(ttl, 1)
+        except RedisError:
+            return self._hit_local(key)
+
+    async def reset(self, name: str):
+        key = f'{self.prefix}:{name}'
+        self._local.pop(key, None)
+        try:
+            await self.redis.delete(key)
+        except RedisError:
+            pass
+
+    async def check(self, name: str, limit: int) -> Optional[int]:
+        """None, если лимит не превышен, иначе — через сколько секунд можно повторить."""
+        count, retry_after = await self.hit(name)
+        return retry_after if count > limit else None
+
+
+login_limiter = RateLimiter(redis_client, 'pdd:login', LOGIN_RATE_LIMIT_WINDOW)
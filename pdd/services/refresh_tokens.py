@@ -0,0 +1,123 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pdd.db.config import (
+    REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_TOKENS_PER_USER,
+    REFRESH_TOKEN_PURGE_INTERVAL, REFRESH_TOKEN_PURGE_CHUNK)
+from pdd.db.database import SessionLocal
+from pdd.db.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+async def store_refresh_token(db: AsyncSession, user_id: int, token: str):
+    """Сохраняет хеш токена и удаляет самые старые сверх лимита на пользователя. Без commit."""
+    db.add(RefreshToken(user_id=user_id, token_hash=hash_token(token),
+                        expires_at=datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)))
+    await db.flush()
+
+    stale = (
+        select(RefreshToken.id)
+        .where(RefreshToken.user_id == user_id)
+        .order_by(RefreshToken.created_date.desc(), RefreshToken.id.desc())
+        .offset(REFRESH_TOKENS_PER_USER)
+    )
+    await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(stale))
+                     .execution_options(synchronize_session=False))
+
+
+async def consume_refresh_token(db: AsyncSession, token: str) -> Optional[int]:
+    """Удаляет действующий токен и возвращает его user_id.
+
+    Один DELETE ... RETURNING: из двух одновременных обменов одного токена
+    пройдёт только один.
+    """
+    return await db.scalar(
+        delete(RefreshToken)
+        .where(RefreshToken.token_hash == hash_token(token),
+               RefreshToken.expires_at > datetime.utcnow())
+        .returning(RefreshToken.user_id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+class RefreshTokenPurger:
+    """Фоновое удаление просроченных refresh-токенов.
+
+    Удаляет пачками по ``chunk_size`` строк, каждая пачка — своя короткая
+    транзакция, а ``SKIP LOCKED`` не даёт ждать строки, занятые входом или
+    обменом токена.
+    """
+
+    def __init__(self, interval: float = 3600, chunk_size: int = 1000, pause: float = 0.1):
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self._task: Optional[asyncio.Task] = None
+
+        self.purged_total = 0
+        self.last_run: Optional[datetime] = None
+        self.failed_runs = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.purge()
+            except Exception:
+                logger.exception('Failed to purge expired refresh tokens')
+                self.failed_runs += 1
+            await asyncio.sleep(self.interval)
+
+    async def purge(self) -> int:
+        purged = 0
+        while True:
+            expired = (
+                select(RefreshToken.id)
+                .where(RefreshToken.expires_at < datetime.utcnow())
+                .limit(self.chunk_size)
+                .with_for_update(skip_locked=True)
+            )
+            async with SessionLocal() as db:
+                result = await db.execute(delete(RefreshToken).where(RefreshToken.id.in_(expired))
+                                          .execution_options(synchronize_session=False))
+                await db.commit()
+            purged += result.rowcount
+            self.purged_total += result.rowcount
+            if result.rowcount < self.chunk_size:
+                break
+            await asyncio.sleep(self.pause)
+        self.last_run = datetime.utcnow()
+        return purged
+
+    def stats(self) -> dict:
+        return {
+            'purged_total': self.purged_total,
+            'last_run': self.last_run,
+            'failed_runs': self.failed_runs,
+        }
+
+
+token_purger = RefreshTokenPurger(REFRESH_TOKEN_PURGE_INTERVAL, REFRESH_TOKEN_PURGE_CHUNK)